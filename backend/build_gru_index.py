@@ -0,0 +1,57 @@
+"""
+Construction hors ligne de l'index approché (IVF) du recommandeur GRU.
+
+Usage :
+    python build_gru_index.py [--lists N] [--nprobe P] [--check 200] [--min-recall 0.9] [--force]
+
+Charge les vecteurs musicaux du MusicRecommender, apprend les centroïdes
+par k-means et mesure le recall@10 face à la recherche exacte. L'index n'est
+sauvegardé à côté des fichiers du modèle (recommender/ann_index_ivf.npz) que
+si ce recall atteint --min-recall : sur des vecteurs peu groupés, l'IVF peut
+rater la majorité des voisins. L'API ne le charge qu'avec GRU_SEARCH_MODE=ann,
+et l'ignore si les vecteurs ont changé depuis sa construction (empreinte).
+"""
+import argparse
+
+import numpy as np
+
+from recommender.gru_model import get_recommender, GRU_ANN_NPROBE
+from recommender.ann_index import hybrid_recall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit l'index IVF des vecteurs GRU")
+    parser.add_argument("--lists", type=int, default=None, help="Nombre de listes IVF (défaut : ~4 * sqrt(n))")
+    parser.add_argument("--nprobe", type=int, default=GRU_ANN_NPROBE, help="Listes sondées par requête")
+    parser.add_argument("--check", type=int, default=200,
+                        help="Requêtes de contrôle du recall@10 vs recherche exacte (0 = aucun, exige --force)")
+    parser.add_argument("--min-recall", type=float, default=0.9,
+                        help="Recall@10 minimal pour sauvegarder l'index")
+    parser.add_argument("--force", action="store_true", help="Sauvegarde l'index quel que soit le recall")
+    args = parser.parse_args()
+    if not args.check and not args.force:
+        raise SystemExit("❌ --check 0 : recall non vérifié, relancer avec --force pour sauvegarder quand même")
+
+    recommender = get_recommender()
+    if not recommender.is_ready:
+        raise SystemExit("❌ Recommandeur GRU indisponible")
+
+    index = recommender.build_ann_index(n_lists=args.lists, nprobe=args.nprobe, save=False)
+    print(f"   → Index IVF construit ({index.n_items} vecteurs, {index.n_lists} listes)")
+
+    if args.check:
+        store = recommender.vector_store
+        rng = np.random.default_rng(0)
+        # requêtes de contrôle : vecteurs du catalogue bruités
+        rows = np.sort(rng.choice(len(store), args.check, replace=False))
+        queries = np.asarray(store.exact[rows] if store.exact is not None else store.codes[rows], dtype=np.float32)
+        queries = queries + rng.normal(scale=queries.std(), size=queries.shape).astype(np.float32)
+        recall = hybrid_recall(store, recommender.db_interests, index, queries,
+                               top_k=10, extra_candidates=recommender.popular_candidates)
+        print(f"   → recall@10 (nprobe={args.nprobe}) : {recall:.3f}")
+        if recall < args.min_recall and not args.force:
+            raise SystemExit(f"❌ Recall insuffisant (< {args.min_recall}) : index non sauvegardé "
+                             f"(augmenter --nprobe, réduire --lists, ou garder GRU_SEARCH_MODE=exact)")
+
+    index.save(recommender.ann_index_path)
+    print(f"✅ Index IVF écrit dans {recommender.ann_index_path} - activer avec GRU_SEARCH_MODE=ann")
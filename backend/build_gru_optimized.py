@@ -0,0 +1,79 @@
+"""
+Construction et contrôle du mode d'inférence optimisé du recommandeur GRU.
+
+Usage :
+    python build_gru_optimized.py [--queries recherches.txt] [--histories 500] [--max-seq-len 32]
+
+Compile le GRU quantifié int8 (TorchScript) dans recommender/optimized_model/,
+réutilisé ensuite au démarrage de l'API avec GRU_INFERENCE_MODE=optimized,
+puis compare les modèles float et optimisés : cosinus des embeddings MiniLM,
+cosinus des vecteurs "envie" et recouvrement des top-10, et temps d'inférence.
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+import torch
+
+os.environ["GRU_INFERENCE_MODE"] = "float"
+from recommender.gru_model import get_recommender, default_paths, find_model_file
+from recommender.optimized import (
+    OPTIMIZED_DIR, load_optimized_gru, optimize_encoder, compare_models, compare_encoders
+)
+
+
+# Recherches d'exemple si aucun fichier n'est fourni
+SAMPLE_QUERIES = [
+    "rock indé", "guitare acoustique", "chill", "musique pour courir", "jazz des années 50",
+    "rap français", "electro calme", "piano triste", "soirée dansante", "lo-fi pour travailler",
+    "punk rapide", "folk américaine", "musique classique baroque", "ambient nuit", "hip hop old school",
+    "chanson française", "synthwave", "blues du delta", "techno berlin", "reggae",
+]
+
+
+def _timed_ms(func, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit et contrôle le GRU / MiniLM optimisés (int8)")
+    parser.add_argument("--queries", default=None, help="Fichier de recherches (une par ligne)")
+    parser.add_argument("--histories", type=int, default=500, help="Historiques aléatoires comparés")
+    parser.add_argument("--max-seq-len", type=int, default=32, help="Longueur maximale des recherches encodées")
+    args = parser.parse_args()
+
+    recommender = get_recommender()
+    if not recommender.is_ready:
+        raise SystemExit("❌ Recommandeur GRU indisponible")
+
+    base_path, systemeia_path = default_paths()
+    model_file = find_model_file("modele_gru_109k.pth", base_path, systemeia_path)
+    optimized_gru = load_optimized_gru(recommender.model, model_file, os.path.join(base_path, OPTIMIZED_DIR))
+    print(f"✅ GRU int8 compilé dans {os.path.join(base_path, OPTIMIZED_DIR)}")
+
+    queries = SAMPLE_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    # 1. Encodeur : embeddings float vs int8 (séquences tronquées)
+    optimized_encoder = optimize_encoder(recommender.encoder, args.max_seq_len, inplace=False)
+    print(f"   → MiniLM : {compare_encoders(recommender.encoder, optimized_encoder, queries)}")
+    print(f"   → MiniLM : {_timed_ms(lambda: recommender.encoder.encode(queries[:20]), 10):.1f} ms float, "
+          f"{_timed_ms(lambda: optimized_encoder.encode(queries[:20]), 10):.1f} ms int8 (20 recherches)")
+
+    # 2. GRU : vecteurs "envie" et top-10 sur des historiques aléatoires
+    embeddings = torch.from_numpy(recommender.embedding_cache.encode(queries))
+    rng = np.random.default_rng(0)
+    sequences = [embeddings[rng.integers(0, len(queries), rng.integers(1, 21))] for _ in range(args.histories)]
+    report = compare_models(recommender.model, optimized_gru, sequences,
+                            recommender.vector_store, recommender.db_interests)
+    print(f"   → GRU : {report}")
+    x = embeddings[rng.integers(0, len(queries), 20)].unsqueeze(0)
+    with torch.no_grad():
+        print(f"   → GRU : {_timed_ms(lambda: recommender.model.advance(x)):.2f} ms float, "
+              f"{_timed_ms(lambda: optimized_gru.advance(x)):.2f} ms int8 (20 recherches)")
@@ -0,0 +1,61 @@
+"""
+Construction hors ligne de l'index TF-IDF.
+
+Usage :
+    python build_tfidf.py [--out DOSSIER] [--neighbors N] [--jobs J] [--svd D]
+    python build_tfidf.py --graph-only      # reprend un graphe de voisins interrompu
+    python build_tfidf.py --update 12 345   # mise à jour incrémentale de quelques pistes
+
+Lit le catalogue depuis la BDD, ajuste le ContentRecommender et sauvegarde
+l'artefact versionné chargé par l'API au démarrage, puis pré-calcule
+le graphe des N plus proches voisins de chaque piste.
+"""
+import argparse
+
+from main import (
+    SessionLocal, build_tfidf_index, update_tfidf_index,
+    TFIDF_ARTIFACT_DIR, TFIDF_GRAPH_NEIGHBORS, TFIDF_SVD_COMPONENTS
+)
+from recommender.neighbor_graph import build_neighbor_graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit l'index TF-IDF sur disque")
+    parser.add_argument("--out", default=TFIDF_ARTIFACT_DIR, help="Dossier de l'artefact")
+    parser.add_argument("--neighbors", type=int, default=TFIDF_GRAPH_NEIGHBORS,
+                        help="Voisins pré-calculés par piste (0 = pas de graphe)")
+    parser.add_argument("--jobs", type=int, default=None, help="Processus pour le graphe (défaut : tous les cœurs)")
+    parser.add_argument("--block-size", type=int, default=512, help="Lignes par bloc du graphe")
+    parser.add_argument("--svd", type=int, default=TFIDF_SVD_COMPONENTS,
+                        help="Dimension des embeddings denses SVD (0 = pas de mode dense)")
+    parser.add_argument("--graph-only", action="store_true",
+                        help="Ne recalcule que le graphe de voisins de l'artefact existant (reprise)")
+    parser.add_argument("--update", type=int, nargs="+", metavar="TRACK_ID",
+                        help="Met à jour ces pistes sans tout reconstruire (absentes de la BDD = supprimées)")
+    args = parser.parse_args()
+
+    if args.update:
+        db = SessionLocal()
+        try:
+            report = update_tfidf_index(db, args.update, args.out)
+        finally:
+            db.close()
+        print(f"✅ Index TF-IDF mis à jour : {report}")
+        raise SystemExit(0)
+
+    if args.graph_only:
+        info = build_neighbor_graph(args.out, n_neighbors=args.neighbors,
+                                    block_size=args.block_size, n_jobs=args.jobs)
+        print(f"✅ Graphe de voisins écrit dans {args.out} "
+              f"({info['n_items']} titres, {info['n_neighbors']} voisins)")
+        raise SystemExit(0)
+
+    db = SessionLocal()
+    try:
+        manifest = build_tfidf_index(db, args.out, n_neighbors=args.neighbors, n_jobs=args.jobs,
+                                     svd_components=args.svd)
+    finally:
+        db.close()
+
+    print(f"✅ Index TF-IDF v{manifest['version']} écrit dans {args.out} "
+          f"({manifest['n_tracks']} titres, {manifest['n_features']} termes)")
@@ -0,0 +1,40 @@
+"""
+Conversion des vecteurs musicaux du recommandeur GRU au format memory-map.
+
+Usage :
+    python convert_gru_vectors.py [--out recommender/vector_store] [--modes int8]
+
+Lit la source .pt (data_vectors_109k.pt ou vectors_chunks/vectors_chunk_{i}.pt)
+paquet par paquet, normalise les vecteurs et écrit vectors_f32.npy, ouvert
+ensuite sans copie (np.memmap) par chaque worker de l'API, ainsi que
+track_ids.npy (la colonne track_id de data_metadata_109k.pkl).
+À relancer après chaque mise à jour des vecteurs.
+"""
+import os
+import argparse
+
+from recommender.gru_model import (
+    VECTOR_STORE_DIR, convert_track_ids, default_paths, find_model_file, vector_chunks
+)
+from recommender.vector_store import VectorStore, convert_vectors
+
+
+if __name__ == "__main__":
+    base_path, systemeia_path = default_paths()
+    parser = argparse.ArgumentParser(description="Convertit les vecteurs GRU (.pt) en .npy memory-mappable")
+    parser.add_argument("--out", default=os.path.join(base_path, VECTOR_STORE_DIR), help="Dossier de sortie")
+    parser.add_argument("--modes", nargs="*", default=[], choices=["float16", "int8"],
+                        help="Codes quantifiés à pré-calculer")
+    args = parser.parse_args()
+
+    shape, chunks, source = vector_chunks(base_path, systemeia_path)
+    print(f"🔄 Conversion de {source} ({shape[0]} x {shape[1]})...")
+    info = convert_vectors(chunks, shape, args.out, source=source)
+    meta_file = find_model_file("data_metadata_109k.pkl", base_path, systemeia_path)
+    if meta_file:
+        track_ids = convert_track_ids(meta_file, args.out)
+        print(f"   → {len(track_ids)} track_id extraits de {meta_file}")
+    for mode in args.modes:
+        store = VectorStore.load(args.out, mode)
+        print(f"   → Codes {mode} : {store.nbytes / 2 ** 20:.0f} Mo")
+    print(f"✅ Vecteurs écrits dans {args.out} ({info['n_items']} vecteurs)")
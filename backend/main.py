@@ -1,8 +1,9 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 
 import bcrypt
 
@@ -17,13 +18,16 @@ import schema
 from schema import (    
     UserCreate, PlaylistCreate, ListeningHistoryCreate, UserAlbumListeningCreate, UserPlaylistListeningCreate,
     PlaylistUserFavoriteCreate, TrackUserFavoriteCreate, UserArtistFavoriteCreate, UserAlbumFavoriteCreate, PlaylistUserCreate,
-    PlaylistTrackCreate, UserTrackListeningCreate, SearchHistoryCreate, TrackView,
+    PlaylistTrackCreate, UserTrackListeningCreate, SearchHistoryCreate, TrackView, TfidfIndexUpdate,
 
     UserUpdate, PlaylistUpdate, UserTrackListeningUpdate, UserAlbumListeningUpdate, UserPlaylistListeningUpdate
 )
 
 import uvicorn
 import os
+import time
+import asyncio
+import threading
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -32,6 +36,12 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 import pandas as pd
 
+from recommender.inference import (run_inference, await_future, configure_threads, limit_blas_threads,
+                                   shutdown as shutdown_inference)
+from recommender.loader import BackgroundLoader
+from recommender.result_cache import ResultCache, history_key
+from recommender.embedding_cache import normalize_query
+
 load_dotenv()
 
 # Configuration JWT
@@ -110,6 +120,14 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
     return user
 
+# Comptes autorisés à reconstruire / modifier l'index TF-IDF (user_id séparés par des virgules)
+ADMIN_USER_IDS = {int(uid) for uid in os.getenv("ADMIN_USER_IDS", "").split(",") if uid.strip()}
+
+def get_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.user_id not in ADMIN_USER_IDS:
+        raise HTTPException(status_code=403, detail="Opération réservée aux administrateurs")
+    return current_user
+
 
 ###########################################
 ##               ROUTES                  ##
@@ -235,23 +253,109 @@ def get_user_by_id(user_id: int, db: Session = Depends(get_db), current_user: Us
 
 ####### RECOMMANDATIONS IA ##
 
-# Import lazy du recommandeur (évite le chargement si pas utilisé)
-_recommender = None
+# Le recommandeur est chargé en tâche de fond dès le démarrage, puis chauffé
+# avant d'être servi (recommender/loader.py) ; /health/ready indique quand.
+
+# Délai avant une nouvelle tentative de chargement d'un modèle après un échec
+MODEL_RETRY_SECONDS = float(os.getenv("MODEL_RETRY_SECONDS", "60"))
+
+# Recommandations déjà calculées, par utilisateur (invalidées par ses nouvelles écritures)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "100000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+_gru_results = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+# Attente maximale d'une prédiction GRU (secondes) avant de répondre 503
+GRU_PREDICT_TIMEOUT = float(os.getenv("GRU_PREDICT_TIMEOUT", "10"))
+
+# Recherches les plus fréquentes pré-encodées au chargement du recommandeur
+GRU_CACHE_WARMUP = int(os.getenv("GRU_CACHE_WARMUP", "2000"))
+
+def warm_up_query_cache(recommender, limit=GRU_CACHE_WARMUP):
+    """Remplit le cache d'embeddings avec les `limit` history_query les plus fréquentes."""
+    db = SessionLocal()
+    try:
+        rows = db.query(SearchHistory.history_query).filter(
+            SearchHistory.history_query.isnot(None)
+        ).group_by(SearchHistory.history_query).order_by(
+            func.count().desc()
+        ).limit(limit).all()
+        n_entries = recommender.embedding_cache.warm_up([row[0] for row in rows])
+        print(f"   → Cache des recherches : {n_entries} embeddings pré-calculés")
+    except Exception as e:
+        print(f"⚠️ Pré-chargement du cache des recherches impossible : {e}")
+    finally:
+        db.close()
+
+def _load_gru_recommender(components):
+    from recommender.gru_model import MusicRecommender
+    return MusicRecommender.load(components)
+
+def _warm_up_gru_recommender(recommender):
+    # bibliothèques natives chargées avec le modèle : limite de threads réappliquée
+    limit_blas_threads()
+    recommender.warm_up()
+    if GRU_CACHE_WARMUP > 0:
+        # en tâche de fond : le service n'attend pas le pré-chargement
+        threading.Thread(target=warm_up_query_cache, args=(recommender,), daemon=True).start()
+
+_gru_loader = BackgroundLoader("Recommandeur GRU", _load_gru_recommender, _warm_up_gru_recommender,
+                               retry_seconds=MODEL_RETRY_SECONDS)
 
 def get_recommender():
-    """Charge le recommandeur à la première utilisation"""
-    global _recommender
-    if _recommender is None:
-        try:
-            from recommender.gru_model import MusicRecommender
-            _recommender = MusicRecommender()
-        except Exception as e:
-            print(f" Recommandeur non disponible : {e}")
-            return None
-    return _recommender
+    """Le recommandeur GRU s'il est chargé et chauffé, sinon None (chargement en cours ou en échec)"""
+    return _gru_loader.get()
+
+# Les routes de recommandation sont asynchrones : les accès BDD passent par le
+# pool HTTP (run_in_threadpool), les calculs par le pool d'inférence dédié
+# (recommender/inference.py) ou la file de micro-batching du GRU.
+
+def _recent_searches(db: Session, user_id: int, limit: int = 20) -> Optional[List[str]]:
+    """Les `limit` dernières recherches non vides, dans l'ordre chronologique (None si aucune ligne)"""
+    search_results = db.query(SearchHistory.history_query).filter(
+        SearchHistory.user_id == user_id
+    ).order_by(
+        SearchHistory.history_timestamp.desc()
+    ).limit(limit).all()
+    
+    if not search_results:
+        return None
+    
+    # Extraction des strings et inversion pour ordre chronologique
+    history = [row[0] for row in search_results if row[0]]
+    history.reverse()
+    return history
+
+def _tracks_in_order(db: Session, track_ids: List[int]):
+    """Objets complets de la vue, dans l'ordre de pertinence (SQL IN casse l'ordre)"""
+    tracks_db = db.query(ViewTrackMaterialise).filter(ViewTrackMaterialise.track_id.in_(track_ids)).all()
+    tracks_dict = {t.track_id: t for t in tracks_db}
+    return [tracks_dict[tid] for tid in track_ids if tid in tracks_dict]
+
+async def _predict_gru(recommender, history: List[str], limit: int, user_id: int) -> List[int]:
+    """
+    Prédiction GRU : résultat en cache si l'historique n'a pas changé, sinon
+    attendue sans occuper de thread (file de micro-batching si active, pool
+    d'inférence si son thread s'est arrêté). 503 au-delà de GRU_PREDICT_TIMEOUT.
+    """
+    key = history_key(normalize_query(q) for q in history)
+    cached = _gru_results.get(user_id, key, limit)
+    if cached is not None:
+        return list(cached)
+    
+    scheduler = recommender.scheduler
+    if scheduler is not None and scheduler.is_alive:
+        prediction = await_future(scheduler.submit((history, limit, user_id)))
+    else:
+        prediction = run_inference(recommender.predict, history, limit, user_id)
+    try:
+        track_ids = await asyncio.wait_for(prediction, timeout=GRU_PREDICT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Service de recommandation indisponible (délai dépassé)")
+    _gru_results.put(user_id, key, limit, result=tuple(track_ids))
+    return track_ids
 
 @app.get("/users/gru_recommendations")
-def get_user_recommendations(
+async def get_user_recommendations(
     limit: int = 10,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -263,36 +367,28 @@ def get_user_recommendations(
     
     # Récupération du recommandeur
     recommender = get_recommender()
-    if recommender is None or not recommender.is_ready:
+    if recommender is None:
         raise HTTPException(
             status_code=503, 
             detail="Service de recommandation indisponible"
         )
     
-    # Récupération des 20 dernières recherches (du plus récent au plus ancien)
-    search_results = db.query(SearchHistory.history_query).filter(
-        SearchHistory.user_id == current_user.user_id
-    ).order_by(
-        SearchHistory.history_timestamp.desc()
-    ).limit(20).all()
+    # Récupération des 20 dernières recherches (ordre chronologique)
+    history = await run_in_threadpool(_recent_searches, db, current_user.user_id)
     
-    if not search_results:
+    if history is None:
         raise HTTPException(
             status_code=404, 
             detail="Pas d'historique de recherche pour cet utilisateur"
         )
     
-    # Extraction des strings et inversion pour ordre chronologique
-    history = [row[0] for row in search_results if row[0]]
-    history.reverse()
-    
-    # Prédiction via le modèle GRU
-    track_ids = recommender.predict(history, top_k=limit)
+    # Prédiction via le modèle GRU (état en cache si l'historique n'a pas changé)
+    track_ids = await _predict_gru(recommender, history, limit, current_user.user_id)
     
     return {"recommended_track_ids": track_ids}
 
 @app.get("/users/gru_recommendations/detailed", response_model=List[schema.TrackView])
-def get_user_recommendations_detailed(
+async def get_user_recommendations_detailed(
     limit: int = 10,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -302,96 +398,340 @@ def get_user_recommendations_detailed(
     """
     
     recommender = get_recommender()
-    if recommender is None or not recommender.is_ready:
+    if recommender is None:
         raise HTTPException(status_code=503, detail="Service de recommandation indisponible")
     
-    search_results = db.query(SearchHistory.history_query).filter(
-        SearchHistory.user_id == current_user.user_id
-    ).order_by(SearchHistory.history_timestamp.desc()).limit(20).all()
+    history = await run_in_threadpool(_recent_searches, db, current_user.user_id)
     
-    if not search_results:
+    if not history:
         # Pas d'historique -> Pas de reco (liste vide)
         return []
     
-    history = [row[0] for row in search_results if row[0]]
-    history.reverse()
-    
     # 2. Prédiction des IDs
-    track_ids = recommender.predict(history, top_k=limit)
+    track_ids = await _predict_gru(recommender, history, limit, current_user.user_id)
     
     if not track_ids:
         return []
 
-    # 3. Récupération des objets complets depuis la BDD
-    tracks_db = db.query(ViewTrackMaterialise).filter(ViewTrackMaterialise.track_id.in_(track_ids)).all()
-    
-    # 4. Réordonner selon le score de pertinence (car SQL IN casse l'ordre)
-    tracks_dict = {t.track_id: t for t in tracks_db}
-    ordered_tracks = [tracks_dict[tid] for tid in track_ids if tid in tracks_dict]
-    
-    return ordered_tracks
+    # 3-4. Récupération des objets complets depuis la BDD, dans l'ordre du score
+    return await run_in_threadpool(_tracks_in_order, db, track_ids)
 
 
 ####### RECOMMANDATIONS TF-IDF ##
 
-@app.get("/users/tf-idf_recommendations", response_model=List[schema.TrackView])
-def get_user_recommendations_detailed(
-    limit: int = 10,
-    penalty: float = 0.5,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+# L'index TF-IDF est construit hors ligne (build_tfidf.py ou POST /tf-idf/rebuild),
+# sauvegardé sur disque puis chargé en tâche de fond au démarrage.
+TFIDF_ARTIFACT_DIR = os.getenv(
+    "TFIDF_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "recommender", "tfidf_artifact")
+)
+_tfidf_recommender = None
+
+# Une seule reconstruction / mise à jour de l'index à la fois (même dossier d'artefact)
+_tfidf_build_lock = threading.RLock()
+
+def load_catalog_df(db: Session, track_ids: Optional[List[int]] = None) -> pd.DataFrame:
     """
-    Version détaillée : Renvoie les objets Track complets (pour affichage playlist direct).
+    Charge le catalogue (vue matérialisée) dans un DataFrame, éventuellement restreint à des track_id.
+    Lecture en colonnes (COPY / curseur serveur), sans objets ORM (voir recommender.catalog).
+    """
+    from recommender.catalog import load_catalog
+    return load_catalog(db.connection(), track_ids=track_ids)
+
+# Profil mémoire de l'index (voir recommender.TF_IDF.MEMORY_PROFILES)
+TFIDF_MEMORY_PROFILE = os.getenv("TFIDF_MEMORY_PROFILE", "exact")
+
+# Nombre de voisins pré-calculés par piste (0 = pas de graphe, kNN à chaque requête)
+TFIDF_GRAPH_NEIGHBORS = int(os.getenv("TFIDF_GRAPH_NEIGHBORS", "100"))
+# Processus du graphe lors d'une reconstruction dans l'API : bornés pour ne pas
+# prendre les cœurs de l'inférence (build_tfidf.py hors ligne : tous les cœurs)
+TFIDF_GRAPH_JOBS = int(os.getenv("TFIDF_GRAPH_JOBS", "1"))
+
+# Embeddings denses SVD (0 = désactivés) et mode de recherche en ligne ("sparse" ou "dense")
+TFIDF_SVD_COMPONENTS = int(os.getenv("TFIDF_SVD_COMPONENTS", "0"))
+TFIDF_SEARCH_MODE = os.getenv("TFIDF_SEARCH_MODE", "sparse")
+
+# Recommandations TF-IDF par utilisateur (invalidées par ses écoutes, vidées si l'index change)
+_tfidf_results = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+def build_tfidf_index(db: Session, directory: str = TFIDF_ARTIFACT_DIR,
+                      n_neighbors: int = TFIDF_GRAPH_NEIGHBORS, n_jobs: Optional[int] = TFIDF_GRAPH_JOBS,
+                      svd_components: int = TFIDF_SVD_COMPONENTS):
+    """Reconstruit l'index TF-IDF depuis la BDD, le sauvegarde et le met en service"""
+    global _tfidf_recommender
+    from recommender.TF_IDF import ContentRecommender, MEMORY_PROFILES
+    from recommender.neighbor_graph import build_neighbor_graph
+
+    with _tfidf_build_lock:
+        rec = ContentRecommender(load_catalog_df(db), **MEMORY_PROFILES[TFIDF_MEMORY_PROFILE],
+                                 svd_components=svd_components or None)
+        manifest = rec.save(directory)
+        del rec
+        if n_neighbors > 0:
+            build_neighbor_graph(directory, n_neighbors=n_neighbors, n_jobs=n_jobs)
+
+        _tfidf_recommender = _load_tfidf_artifact(directory)
+        _tfidf_results.clear()
+    # l'index devient disponible même si le chargement au démarrage avait échoué
+    _tfidf_loader.retry()
+    return manifest
+
+# Dérive du vocabulaire au-delà de laquelle une mise à jour déclenche un réajustement complet
+TFIDF_DRIFT_THRESHOLD = float(os.getenv("TFIDF_DRIFT_THRESHOLD", "0.05"))
+
+def update_tfidf_index(db: Session, track_ids: List[int], directory: str = TFIDF_ARTIFACT_DIR,
+                       rebuild: bool = True):
     """
+    Met à jour l'index TF-IDF pour quelques pistes ajoutées, modifiées ou supprimées
+    sans tout réajuster. Les track_id absents de la vue sont considérés supprimés.
+    rebuild=False : un réajustement complet nécessaire n'est pas lancé ici
+    (refit_needed=True dans le rapport, à planifier par l'appelant).
+    """
+    global _tfidf_recommender
+    from recommender.TF_IDF import ContentRecommender
 
+    with _tfidf_build_lock:
+        if directory == TFIDF_ARTIFACT_DIR:
+            current = get_tfidf_recommender()
+        else:
+            current = ContentRecommender.load(directory) if os.path.exists(directory) else None
+        if current is None:
+            if not rebuild:
+                return {"full_rebuild": False, "refit_needed": True}
+            return {"full_rebuild": True, **build_tfidf_index(db, directory)}
+
+        changed = load_catalog_df(db, track_ids)
+        present = set(changed["track_id"].tolist()) if not changed.empty else set()
+        removed = [tid for tid in track_ids if tid not in present]
+
+        # la copie est mise à jour pendant que l'index courant continue de répondre
+        rec = current.updated_copy()
+        report = rec.update_tracks(changed, drift_threshold=TFIDF_DRIFT_THRESHOLD)
+        if report["refit_needed"]:
+            if not rebuild:
+                return {"full_rebuild": False, "drift": report["drift"], "refit_needed": True}
+            return {"full_rebuild": True, "drift": report["drift"], **build_tfidf_index(db, directory)}
+
+        report["removed"] = rec.remove_tracks(removed)
+        rec.manifest = rec.save(directory)
+        _tfidf_recommender = rec
+        _tfidf_results.clear()
+        return {"full_rebuild": False, **report}
+
+def _load_tfidf_artifact(directory: str):
+    from recommender.TF_IDF import ContentRecommender
+    rec = ContentRecommender.load(directory)
+    if TFIDF_SEARCH_MODE == "dense" and rec.dense_embeddings is None:
+        print(" Mode dense demandé mais artefact sans embeddings SVD : recherche sparse")
+    else:
+        rec.set_search_mode(TFIDF_SEARCH_MODE)
+    return rec
+
+def _load_tfidf_index(components):
+    """Index en service (reconstruit entre-temps) ou index sauvegardé sur disque"""
+    global _tfidf_recommender
+    start = time.perf_counter()
+    components["index"] = {"state": "loading"}
     try:
-        # 1. Récupération des données pour le moteur de recommandation
-        tracks_data = db.query(ViewTrackMaterialise).all()
+        if _tfidf_recommender is None:
+            _tfidf_recommender = _load_tfidf_artifact(TFIDF_ARTIFACT_DIR)
+    except Exception as e:
+        components["index"] = {"state": "failed", "error": str(e)}
+        raise
+    components["index"] = {"state": "ready", "seconds": round(time.perf_counter() - start, 3),
+                           "n_tracks": _tfidf_recommender.manifest["n_tracks"]}
+    return _tfidf_recommender
+
+def _warm_up_tfidf_index(rec):
+    limit_blas_threads()
+    rec.warm_up()
+
+_tfidf_loader = BackgroundLoader("Index TF-IDF", _load_tfidf_index, _warm_up_tfidf_index,
+                                 retry_seconds=MODEL_RETRY_SECONDS)
+
+def get_tfidf_recommender():
+    """L'index TF-IDF en service s'il est chargé et chauffé, sinon None"""
+    return _tfidf_recommender if _tfidf_loader.is_ready else None
+
+@app.on_event("startup")
+def start_model_loaders():
+    # threads torch / BLAS fixés avant tout calcul (réappliqués après chaque chargement)
+    configure_threads()
+    _gru_loader.start()
+    _tfidf_loader.start()
+
+@app.on_event("shutdown")
+def shutdown_models():
+    """
+    Arrêt ordonné : chargements interrompus, puis états GRU par utilisateur
+    sauvegardés (si GRU_STATE_FILE est défini) tant que le recommandeur est
+    encore utilisable, et enfin arrêt du pool d'inférence.
+    """
+    _gru_loader.stop()
+    _tfidf_loader.stop()
+    recommender = get_recommender()
+    if recommender is not None:
+        n_users = recommender.save_user_states()
+        if n_users:
+            print(f"   → {n_users} états utilisateurs GRU sauvegardés")
+    shutdown_inference()
 
-        data_dict = [
-            {column.name: getattr(track, column.name) for column in track.__table__.columns} 
-            for track in tracks_data
-        ]
+####### SANTÉ ##
 
-        df = pd.DataFrame(data_dict)
-        df = df.fillna('')
+# Modèles qui doivent être chargés et chauffés pour que l'instance reçoive du trafic
+READY_MODELS = [name for name in os.getenv("READY_MODELS", "gru,tfidf").split(",") if name]
 
-        from recommender.TF_IDF import ContentRecommender
-        rec = ContentRecommender(df)
+def _model_loaders():
+    return {"gru": _gru_loader, "tfidf": _tfidf_loader}
 
-        # 2. Récupération de l'historique
-        user_history_query = db.query(
-            UserTrackListening.track_id,
-        ).filter(
-            UserTrackListening.user_id == current_user.user_id
-        ).order_by(UserTrackListening.nb_listening.desc()).first()
+@app.get("/health/live")
+def health_live():
+    """Le processus répond (ne dépend pas des modèles)"""
+    return {"status": "alive"}
 
-        if user_history_query is None:
-            return []
+@app.get("/health/ready")
+def health_ready():
+    """
+    Prêt à recevoir du trafic : modèles de READY_MODELS chargés et chauffés (503 sinon).
+    Détaille l'état, les tentatives et les durées de chargement de chaque modèle et composant.
+    """
+    loaders = _model_loaders()
+    ready = all(loaders[name].is_ready for name in READY_MODELS if name in loaders)
+    report = {"status": "ready" if ready else "not_ready", "required": READY_MODELS,
+              "models": {name: loader.report() for name, loader in loaders.items()}}
+    if not ready:
+        raise HTTPException(status_code=503, detail=report)
+    return report
+
+@app.get("/health/caches")
+def health_caches():
+    """Taux de succès des caches de recommandation (résultats, embeddings et états GRU)"""
+    report = {"gru_results": _gru_results.stats(), "tfidf_results": _tfidf_results.stats()}
+    recommender = get_recommender()
+    if recommender is not None:
+        report["gru_embeddings"] = recommender.embedding_cache.stats()
+        report["gru_user_states"] = recommender.user_states.stats()
+    return report
+
+def _rebuild_tfidf_index():
+    db = SessionLocal()
+    try:
+        manifest = build_tfidf_index(db)
+        print(f" Index TF-IDF reconstruit ({manifest['n_tracks']} titres)")
+    except Exception as e:
+        print(f" Échec de la reconstruction de l'index TF-IDF : {e}")
+    finally:
+        db.close()
 
-        # 3. Calcul des recommandations (renvoie souvent une liste d'IDs)
-        recommended_df = rec.recommend(user_history_query.track_id, top_k=limit, same_artist_penalty=penalty)
+@app.post("/tf-idf/rebuild", status_code=202)
+def rebuild_tfidf_index(background_tasks: BackgroundTasks, current_user: User = Depends(get_admin_user)):
+    """
+    Relance la construction de l'index TF-IDF en tâche de fond.
+    L'ancien index continue de répondre jusqu'à la fin de la reconstruction.
+    """
+    background_tasks.add_task(_rebuild_tfidf_index)
+    return {"status": "rebuild scheduled"}
 
-        if recommended_df.empty:
-            return []
+# Nombre max de pistes écoutées / favorites utilisées pour le profil TF-IDF
+TFIDF_PROFILE_SEEDS = 50
+
+@app.post("/tf-idf/update")
+def update_tfidf(update_data: TfidfIndexUpdate, background_tasks: BackgroundTasks, db: Session = Depends(get_db),
+                 current_user: User = Depends(get_admin_user)):
+    """
+    Mise à jour incrémentale de l'index TF-IDF après un import partiel du catalogue.
+    Si le vocabulaire a trop dérivé, la reconstruction complète part en tâche de fond.
+    """
+    if get_tfidf_recommender() is None:
+        raise HTTPException(status_code=503, detail="Index TF-IDF pas encore chargé")
+    if not _tfidf_build_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Reconstruction de l'index TF-IDF en cours")
+    try:
+        report = update_tfidf_index(db, update_data.track_ids, rebuild=False)
+    finally:
+        _tfidf_build_lock.release()
+
+    if report.get("refit_needed"):
+        background_tasks.add_task(_rebuild_tfidf_index)
+        report["full_rebuild"] = "scheduled"
+    return report
+
+def _tfidf_seed_weights(db: Session, user_id: int, mode: str, seeds: int):
+    """Pistes de départ du profil TF-IDF et leurs poids (titres écoutés + favoris)"""
+    listened = db.query(
+        UserTrackListening.track_id,
+        UserTrackListening.nb_listening,
+    ).filter(
+        UserTrackListening.user_id == user_id
+    ).order_by(UserTrackListening.nb_listening.desc()).limit(1 if mode == "seed" else seeds).all()
+
+    if mode == "seed":
+        return {listened[0].track_id: 1.0} if listened else {}
+
+    weights = {row.track_id: float(row.nb_listening or 1) for row in listened}
+
+    favorites = db.query(TrackUserFavorite.track_id).filter(
+        TrackUserFavorite.user_id == user_id
+    ).order_by(TrackUserFavorite.added_at.desc()).limit(seeds).all()
+
+    # Un favori compte autant que le titre le plus écouté
+    favorite_weight = max(weights.values(), default=1.0)
+    for row in favorites:
+        weights[row.track_id] = weights.get(row.track_id, 0.0) + favorite_weight
+    return weights
+
+@app.get("/users/tf-idf_recommendations", response_model=List[schema.TrackView])
+async def get_user_recommendations_detailed(
+    limit: int = 10,
+    penalty: float = 0.5,
+    mode: str = "profile",
+    seeds: int = TFIDF_PROFILE_SEEDS,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Version détaillée : Renvoie les objets Track complets (pour affichage playlist direct).
 
-        # 4. RÉCUPÉRATION DES OBJETS COMPLETS DEPUIS LA VUE
-        ids_to_fetch = recommended_df["track_id"].tolist()
+    mode = "profile" : profil construit à partir des `seeds` titres les plus écoutés
+                       et des derniers favoris (pondérés par nb_listening)
+    mode = "seed"    : ancien comportement, uniquement le titre le plus écouté
+    """
+
+    # 1. Index TF-IDF pré-calculé (chargé une seule fois)
+    rec = get_tfidf_recommender()
+    if rec is None:
+        raise HTTPException(status_code=503, detail="Index TF-IDF indisponible")
 
-        final_tracks = db.query(ViewTrackMaterialise).filter(
-            ViewTrackMaterialise.track_id.in_(ids_to_fetch)
-        ).all()
+    try:
+        # 2. Récupération de l'historique (titres écoutés + favoris)
+        weights = await run_in_threadpool(_tfidf_seed_weights, db, current_user.user_id, mode, seeds)
 
-        # 5. Trier pour garder l'ordre de pertinence de l'IA
-        tracks_dict = {t.track_id: t for t in final_tracks}
+        if not weights:
+            return []
 
-        ordered_tracks = []
-        for tid in ids_to_fetch:
-            if tid in tracks_dict:
-                ordered_tracks.append(tracks_dict[tid])
+        # 3. Résultat en cache si le profil n'a pas changé, sinon calcul des
+        # recommandations dans le pool d'inférence (liste d'IDs, pas besoin de DataFrame)
+        key = history_key(weights.items())
+        cached = _tfidf_results.get(current_user.user_id, key, mode, limit, penalty)
+        if cached is not None:
+            ids_to_fetch = list(cached)
+        else:
+            if mode == "seed":
+                ids_to_fetch = await run_inference(rec.recommend, next(iter(weights)), top_k=limit,
+                                                   same_artist_penalty=penalty, output="ids")
+            else:
+                # Un seul passage de similarité pour tout le profil
+                ids_to_fetch = await run_inference(
+                    rec.recommend_profile, list(weights.keys()), list(weights.values()), top_k=limit,
+                    same_artist_penalty=penalty, output="ids"
+                )
+            _tfidf_results.put(current_user.user_id, key, mode, limit, penalty, result=tuple(ids_to_fetch))
+
+        if not ids_to_fetch:
+            return []
 
-        return ordered_tracks
+        # 4-5. Objets complets depuis la vue, dans l'ordre de pertinence de l'IA
+        return await run_in_threadpool(_tracks_in_order, db, ids_to_fetch)
 
     except Exception as e:
         print(f" Recommandeur non disponible : {e}")
@@ -609,10 +949,13 @@ def create_user_track_listening_create(user_track_listening_data: UserTrackListe
     db.commit()
     db.refresh(new_user_track_listening_create)
     
+    # Les recommandations TF-IDF de l'utilisateur dépendent de ses écoutes
+    _tfidf_results.invalidate_user(current_user.user_id)
+    
     return new_user_track_listening_create
 
 @app.post("/SearchHistory", status_code=201)
-def create_search_history(search_history_data: SearchHistoryCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_search_history(search_history_data: SearchHistoryCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     
     search_history_dict = search_history_data.model_dump()
     
@@ -624,6 +967,15 @@ def create_search_history(search_history_data: SearchHistoryCreate, db: Session
     db.commit()
     db.refresh(new_search_history_create)
     
+    # Les recommandations GRU en cache ne correspondent plus à l'historique
+    _gru_results.invalidate_user(current_user.user_id)
+    
+    # Avance l'état GRU de l'utilisateur d'un pas (si le recommandeur est déjà chargé)
+    recommender = get_recommender()
+    if recommender is not None:
+        background_tasks.add_task(recommender.observe_search, current_user.user_id,
+                                  new_search_history_create.history_query)
+    
     return new_search_history_create
 
 
@@ -686,6 +1038,7 @@ def update_user_track_listening(track_id: int, user_track_listening_data: UserTr
         setattr(db_user_track_listening, key, value)
 
     db.commit()
+    _tfidf_results.invalidate_user(current_user.user_id)
     return {"status": "success"}
 
 @app.patch("/userAlbumListening/{album_id}")
@@ -0,0 +1,259 @@
+"""
+Index approché des plus proches voisins (IVF) pour les vecteurs du recommandeur GRU.
+
+Au lieu de comparer le vecteur "envie" à tout le catalogue, on partitionne les
+vecteurs en `n_lists` groupes par k-means sphérique (quantification grossière) :
+une requête ne parcourt que les `nprobe` groupes dont le centroïde est le plus
+proche. Le coût d'une requête ne croît plus linéairement avec le catalogue.
+
+L'index (centroïdes + listes) est construit hors ligne et sauvegardé à côté
+des fichiers du modèle ; sans index, la recherche reste exacte.
+Les vecteurs sont lus dans un VectorStore (normalisés, éventuellement quantifiés).
+"""
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+from recommender.vector_store import VectorStore, top_n
+
+
+ANN_INDEX_FILE = "ann_index_ivf.npz"
+
+
+def _normalize_rows(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+def _as_store(vectors):
+    return vectors if isinstance(vectors, VectorStore) else VectorStore.from_vectors(vectors)
+
+def _store_rows(store, rows):
+    """Lignes du stockage en float32 (décodées si quantifiées)."""
+    return store._dequantize(rows, store.codes[rows])
+
+
+# -------------------------
+# k-means sphérique (quantification grossière)
+# -------------------------
+def _assign(vectors, centroids, batch_size=8192):
+    """Groupe le plus proche (cosinus) de chaque vecteur, par paquets."""
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        block = vectors[start:start + batch_size]
+        labels[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+def _assign_store(store, centroids, batch_size=8192):
+    labels = np.empty(len(store), dtype=np.int32)
+    for start in range(0, len(store), batch_size):
+        rows = np.arange(start, min(start + batch_size, len(store)))
+        labels[rows] = np.argmax(_store_rows(store, rows) @ centroids.T, axis=1)
+    return labels
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0, batch_size=8192):
+    """k-means sur vecteurs normalisés L2, centroïdes renormalisés à chaque itération."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(vectors, centroids, batch_size)
+        # somme des vecteurs de chaque groupe en un seul produit sparse x dense
+        membership = sp.csr_matrix((np.ones(len(labels), dtype=vectors.dtype),
+                                    (labels, np.arange(len(labels)))),
+                                   shape=(n_clusters, len(vectors)))
+        sums = membership @ vectors
+        empty = np.asarray(membership.sum(axis=1)).ravel() == 0
+        # groupes vides : réinitialisés sur des points tirés au hasard
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums).astype(vectors.dtype)
+    return centroids
+
+
+# -------------------------
+# Index IVF
+# -------------------------
+class IVFIndex:
+    """
+    Listes inversées : `list_ids[list_offsets[c]:list_offsets[c + 1]]` sont les
+    lignes affectées au centroïde c. Les vecteurs eux-mêmes ne sont pas copiés :
+    l'index est rattaché au VectorStore du recommandeur (`attach`).
+    `fingerprint` (VectorStore.fingerprint) identifie les vecteurs indexés.
+    """
+    def __init__(self, centroids, list_ids, list_offsets, nprobe=16, fingerprint=None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_ids = np.asarray(list_ids, dtype=np.int32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.nprobe = nprobe
+        self.fingerprint = fingerprint
+        self.store = None
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def n_items(self):
+        return len(self.list_ids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_iter=10, sample_size=100_000, nprobe=16, seed=0):
+        """
+        vectors     : VectorStore (ou matrice brute, normalisée dans une copie)
+        n_lists     : nombre de groupes (défaut : ~4 * sqrt(n))
+        sample_size : vecteurs utilisés pour apprendre les centroïdes
+        """
+        store = _as_store(vectors)
+        n_lists = n_lists or max(int(4 * np.sqrt(len(store))), 1)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.arange(len(store))
+        if len(store) > sample_size:
+            sample_rows = np.sort(rng.choice(len(store), sample_size, replace=False))
+        centroids = spherical_kmeans(_store_rows(store, sample_rows), n_lists, n_iter=n_iter, seed=seed)
+
+        labels = _assign_store(store, centroids)
+        list_ids = np.argsort(labels, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+        return cls(centroids, list_ids, list_offsets, nprobe=nprobe,
+                   fingerprint=store.fingerprint()).attach(store)
+
+    def attach(self, vectors):
+        """Rattache le stockage des vecteurs (partagé, jamais copié)."""
+        if len(vectors) != self.n_items:
+            raise ValueError(f"Index IVF construit pour {self.n_items} vecteurs, {len(vectors)} fournis")
+        store = _as_store(vectors)
+        # même nombre de lignes ne suffit pas : vecteurs réécrits (convert_gru_vectors.py)
+        if self.fingerprint is not None and self.fingerprint != store.fingerprint():
+            raise ValueError("Index IVF construit pour d'autres vecteurs (empreinte différente)")
+        self.store = store
+        return self
+
+    def search(self, query, n, nprobe=None, weight=1.0, bias=None):
+        """
+        Top-n voisins cosinus de `query` [d] parmi les `nprobe` listes les plus proches.
+        Avec `bias` (un score a priori par ligne), le classement se fait sur
+        `weight * cosinus + bias`.
+        Retourne (indices, scores) triés par score décroissant.
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+
+        probed = top_n(self.centroids @ query, nprobe)
+        ids = np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probed])
+        # lecture triée des lignes : accès plus séquentiel au stockage
+        ids.sort()
+        scores = self.store.scores_for(ids, query)
+        if bias is not None:
+            scores = scores * weight + bias[ids]
+        top = top_n(scores, min(n, len(ids)))
+        return ids[top], scores[top]
+
+    @property
+    def nbytes(self):
+        return int(self.centroids.nbytes + self.list_ids.nbytes + self.list_offsets.nbytes)
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, list_ids=self.list_ids, list_offsets=self.list_offsets,
+                 fingerprint=np.array(self.fingerprint or ""))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, vectors, nprobe=16):
+        with np.load(path) as data:
+            fingerprint = str(data["fingerprint"]) if "fingerprint" in data.files else ""
+            if not fingerprint:
+                raise ValueError("Index IVF sans empreinte des vecteurs : à reconstruire (build_gru_index.py)")
+            index = cls(data["centroids"], data["list_ids"], data["list_offsets"], nprobe=nprobe,
+                        fingerprint=fingerprint)
+        return index.attach(vectors)
+
+
+def load_ann_index(path, vectors, nprobe=16):
+    """Charge l'index s'il existe et correspond aux vecteurs, sinon None (recherche exacte)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return IVFIndex.load(path, vectors, nprobe=nprobe)
+    except ValueError as e:
+        print(f"⚠️ Index ANN ignoré ({e}) : recherche exacte")
+        return None
+
+
+# -------------------------
+# Recherche hybride (sémantique + popularité)
+# -------------------------
+def hybrid_top_k(query, store, interests, top_k, semantic_weight=0.7, popularity_weight=0.3,
+                 index=None, n_candidates=200, extra_candidates=None, rerank=100):
+    """
+    Top-k selon `semantic_weight * cosinus + popularity_weight * intérêt`.
+
+    Sans index : un seul produit matrice-vecteur sur tout le stockage (vecteurs
+    déjà normalisés). En mode quantifié, les `rerank` meilleurs sont re-notés exactement.
+    Avec index : le score hybride est calculé dans les listes sondées par l'index,
+    puis complété par `extra_candidates` (ex : les titres les plus populaires,
+    qui peuvent gagner sans être dans le voisinage sémantique de la requête).
+    """
+    query = np.asarray(query, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    bias = interests * popularity_weight
+
+    if index is None:
+        scores = store.scores(query) * semantic_weight + bias
+        if store.is_exact:
+            return top_n(scores, top_k)
+        cand = top_n(scores, max(rerank, top_k))
+    else:
+        cand, _ = index.search(query, max(n_candidates, top_k), weight=semantic_weight, bias=bias)
+        if extra_candidates is not None:
+            cand = np.union1d(cand, extra_candidates)
+
+    # score exact (copie float32) sur les candidats
+    scores = store.exact_scores_for(cand, query) * semantic_weight + bias[cand]
+    return cand[top_n(scores, top_k)]
+
+def hybrid_top_k_many(queries, store, interests, top_k, semantic_weight=0.7, popularity_weight=0.3,
+                      index=None, n_candidates=200, extra_candidates=None, rerank=100):
+    """
+    Version batch de hybrid_top_k pour [n_requêtes, d] : sans index, un seul
+    produit matriciel pour tout le batch. Avec index, chaque requête parcourt
+    ses propres listes. Retourne une liste de tableaux d'indices.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    if index is not None:
+        return [hybrid_top_k(q, store, interests, top_k, semantic_weight, popularity_weight, index=index,
+                             n_candidates=n_candidates, extra_candidates=extra_candidates, rerank=rerank)
+                for q in queries]
+
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    bias = interests * popularity_weight
+    scores = store.scores_many(queries)
+    scores *= semantic_weight
+    scores += bias
+    results = []
+    for query, row in zip(queries, scores):
+        if store.is_exact:
+            results.append(top_n(row, top_k))
+            continue
+        cand = top_n(row, max(rerank, top_k))
+        exact = store.exact_scores_for(cand, query) * semantic_weight + bias[cand]
+        results.append(cand[top_n(exact, top_k)])
+    return results
+
+def exact_hybrid_top_k(query, store, interests, top_k, semantic_weight=0.7, popularity_weight=0.3):
+    """Référence : score hybride exact (copie float32) sur tout le catalogue."""
+    query = np.asarray(query, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    scores = np.asarray(store.exact @ query) * semantic_weight + interests * popularity_weight
+    return top_n(scores, top_k)
+
+def hybrid_recall(store, interests, index, queries, top_k=10, extra_candidates=None, rerank=100):
+    """recall@k moyen de la recherche hybride (index et/ou quantification) vs recherche exacte."""
+    recalls = []
+    for query in queries:
+        exact = exact_hybrid_top_k(query, store, interests, top_k)
+        approx = hybrid_top_k(query, store, interests, top_k, index=index, extra_candidates=extra_candidates,
+                              rerank=rerank)
+        recalls.append(len(np.intersect1d(exact, approx)) / len(exact))
+    return float(np.mean(recalls)) if recalls else float("nan")
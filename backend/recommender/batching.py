@@ -0,0 +1,99 @@
+"""
+Regroupement des requêtes concurrentes du recommandeur GRU (micro-batching).
+
+Chaque requête /users/gru_recommendations faisait son propre encodage MiniLM,
+sa propre passe GRU et son propre produit avec tout le catalogue (batch de 1).
+Le BatchScheduler met les requêtes en file et un thread dédié les traite par
+paquets : il attend au plus `max_wait_ms` après la première requête, ou
+jusqu'à `max_batch_size` requêtes, puis appelle une seule fois la fonction
+batch (ex : MusicRecommender.predict_many).
+"""
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """
+    batch_fn       : fonction list[requête] -> list[résultat] (même ordre)
+    max_batch_size : nombre maximal de requêtes par appel
+    max_wait_ms    : attente maximale, après la première requête, pour remplir le paquet
+    """
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self.n_batches = 0
+        self.n_requests = 0
+        self._thread = threading.Thread(target=self._run, name="gru-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, request):
+        """Met la requête en file ; le résultat arrive dans le Future retourné."""
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def __call__(self, request):
+        """Appel bloquant : soumet la requête et attend son résultat."""
+        return self.submit(request).result()
+
+    @property
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _collect(self):
+        batch = []
+        item = self._queue.get()
+        deadline = time.perf_counter() + self.max_wait
+        while True:
+            # requête annulée entre-temps (client déconnecté) : ignorée
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+            if len(batch) >= self.max_batch_size:
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _resolve(future, result=None, error=None):
+        # une future déjà résolue ne doit pas arrêter le thread
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception:
+            pass
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+            requests = [request for request, _ in batch]
+            try:
+                results = self.batch_fn(requests)
+            except Exception as e:
+                # une erreur du batch est renvoyée à chacune de ses requêtes
+                for _, future in batch:
+                    self._resolve(future, error=e)
+                continue
+            for (_, future), result in zip(batch, results):
+                self._resolve(future, result)
+            self.n_batches += 1
+            self.n_requests += len(batch)
+
+    def stats(self):
+        return {"batches": self.n_batches, "requests": self.n_requests,
+                "mean_batch_size": self.n_requests / self.n_batches if self.n_batches else 0.0}
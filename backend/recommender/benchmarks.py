@@ -0,0 +1,841 @@
+"""
+Benchmarks des moteurs de recommandation (TF-IDF et GRU) sur des données synthétiques.
+
+Usage :
+    python -m recommender.benchmarks text_features --sizes 100000 1000000
+    python -m recommender.benchmarks memory --sizes 100000
+    python -m recommender.benchmarks evaluate --sizes 100000 --sample-size 10000 --jobs 8
+    python -m recommender.benchmarks search --sizes 100000 1000000
+    python -m recommender.benchmarks dense --sizes 100000 --dims 64 128 256
+    python -m recommender.benchmarks fields --sizes 100000 1000000
+    python -m recommender.benchmarks catalog --sizes 109000 [--url postgresql://...]
+    python -m recommender.benchmarks ann --sizes 109000 1000000
+    python -m recommender.benchmarks vectors --sizes 100000
+    python -m recommender.benchmarks vector_load --sizes 109000 1000000
+    python -m recommender.benchmarks query_cache --sizes 1000 10000
+    python -m recommender.benchmarks batching --sizes 109000 --concurrency 1 8 32 64
+    python -m recommender.benchmarks routes --sizes 109000 --concurrency 8 32 64
+    python -m recommender.benchmarks result_cache --sizes 1000 10000
+"""
+import os
+import re
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+from recommender.TF_IDF import (
+    ContentRecommender, MEMORY_PROFILES, build_text_documents, neighbor_overlap, evaluation_report, dense_recall,
+    evaluate_coherence
+)
+
+
+# -------------------------
+# Catalogue synthétique
+# -------------------------
+_GENRES = ["Rock", "Pop", "Hip-Hop", "Electronic", "Jazz", "Folk", "Experimental",
+           "Punk", "Blues", "Soul-RnB", "Lo-Fi", "Noise", "Classical", "Old-Time / Historic"]
+_TAGS = ["chill", "loud", "guitar", "synth", "ambient", "dance", "sad", "happy",
+         "live", "remix", "lo-fi", "instrumental", "vocal", "80s", "field recording"]
+_WORDS = ["love", "night", "city", "dream", "fire", "rain", "blue", "road", "heart",
+          "star", "time", "ghost", "summer", "river", "machine", "gold", "echo", "wild"]
+_LANGUAGES = ["English", "French", "Spanish", "German", ""]
+
+
+def make_synthetic_catalog(n_tracks, seed=42):
+    """
+    Génère un catalogue ayant la forme de view_track_materialise
+    (répétitions d'artistes, genres et tags comparables au vrai catalogue).
+    """
+    rng = np.random.default_rng(seed)
+    n_artists = max(n_tracks // 8, 1)
+    n_albums = max(n_tracks // 10, 1)
+
+    artists = np.array([f"{rng.choice(_WORDS).title()} {rng.choice(_WORDS).title()} #{i}"
+                        for i in range(n_artists)], dtype=object)
+    albums = np.array([f"{rng.choice(_WORDS).title()} Vol. {i}" for i in range(n_albums)], dtype=object)
+
+    def multi_values(pool, max_count, size):
+        # on tire un nombre limité de combinaisons, comme dans les vraies données
+        combos = np.array(["|".join(rng.choice(pool, rng.integers(0, max_count + 1), replace=False))
+                           for _ in range(512)], dtype=object)
+        return combos[rng.integers(0, len(combos), size)]
+
+    title_words = rng.choice(_WORDS, size=(n_tracks, 3))
+    title_len = rng.integers(1, 4, n_tracks)
+    titles = [" ".join(words[:k]) for words, k in zip(title_words, title_len)]
+
+    genres_list = multi_values(_GENRES, 3, n_tracks)
+    return pd.DataFrame({
+        "track_id": np.arange(1, n_tracks + 1, dtype=np.int64) * 2,
+        "track_title": titles,
+        "artist_name": artists[rng.integers(0, n_artists, n_tracks)],
+        "album_title": albums[rng.integers(0, n_albums, n_tracks)],
+        "track_genre_maj": rng.choice(_GENRES + [""], n_tracks),
+        "genres_list": genres_list,
+        "tags_list": multi_values(_TAGS, 4, n_tracks),
+        "languages_list": rng.choice(_LANGUAGES, n_tracks),
+        "genre_title": [g.split("|")[0] for g in genres_list],
+    })
+
+
+# -------------------------
+# Implémentation historique (référence)
+# -------------------------
+def _legacy_split_genres(genres_field):
+    if pd.isna(genres_field):
+        return []
+    tokens = re.split(r"[|,/;]+|\s+", str(genres_field))
+    return [_legacy_clean_text(t) for t in tokens if _legacy_clean_text(t)]
+
+def _legacy_clean_text(s):
+    if pd.isna(s):
+        return ""
+    s = str(s).lower()
+    s = re.sub(r"[\W_]+", " ", s)
+    s = re.sub(r"\s+", " ", s).strip()
+    return s
+
+def legacy_text_documents(df,
+                          text_columns=("genre_title", "language_name", "track_title"),
+                          artist_col="artist_name",
+                          tag_col="tags_list",
+                          multi_genre_col="genres_list",
+                          maj_genre_col="track_genre_maj"):
+    """Ancienne construction ligne à ligne (iterrows), conservée pour comparaison."""
+    df = df.copy().reset_index(drop=True)
+    df["_genres_list"] = df[multi_genre_col].apply(_legacy_split_genres)
+    df["_tags_list"] = df[tag_col].apply(_legacy_split_genres)
+    df["_maj_genre_tok"] = df[maj_genre_col].fillna("").apply(_legacy_clean_text)
+    df["_artist_tok"] = df[artist_col].fillna("").astype(str).apply(
+        lambda s: "artist_" + _legacy_clean_text(s).replace(" ", "_") if s.strip() else "")
+
+    text_parts = []
+    for col in text_columns:
+        if col in df.columns:
+            text_parts.append(df[col].fillna("").astype(str).apply(_legacy_clean_text))
+        else:
+            text_parts.append(pd.Series([""] * len(df)))
+
+    docs = []
+    for i, row in df.iterrows():
+        parts = []
+        parts += (row["_genres_list"] * 4)
+        parts += (row["_tags_list"] * 2)
+        if row["_maj_genre_tok"]:
+            parts.append(("majgenre_" + row["_maj_genre_tok"] + " ") * 5)
+        if row["_artist_tok"]:
+            parts.append(row["_artist_tok"])
+        for col_series in text_parts:
+            txt = col_series.iloc[i]
+            if txt:
+                parts.append(txt)
+        docs.append(" ".join(parts))
+    return docs
+
+
+# -------------------------
+# Benchmarks
+# -------------------------
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def bench_text_features(sizes, skip_legacy_above=None):
+    """Compare la construction des documents (ancienne vs vectorisée)."""
+    rows = []
+    for n in sizes:
+        df = make_synthetic_catalog(n)
+        new_docs, new_time = _timed(build_text_documents, df)
+
+        if skip_legacy_above is not None and n > skip_legacy_above:
+            rows.append({"n_tracks": n, "legacy_s": np.nan, "vectorized_s": new_time,
+                         "speedup": np.nan, "identical": None})
+            continue
+
+        old_docs, old_time = _timed(legacy_text_documents, df)
+        rows.append({"n_tracks": n, "legacy_s": old_time, "vectorized_s": new_time,
+                     "speedup": old_time / new_time, "identical": old_docs == new_docs})
+    return pd.DataFrame(rows)
+
+def bench_memory_profiles(sizes, sample_size=500, top_k=10, budget_mb=None):
+    """
+    Empreinte mémoire et recouvrement des voisins (vs configuration exacte)
+    pour chaque profil de MEMORY_PROFILES (+ un budget mémoire si demandé).
+    """
+    rows = []
+    for n in sizes:
+        df = make_synthetic_catalog(n)
+        sample = df["track_id"].sample(n=min(sample_size, n), random_state=0).values
+
+        profiles = dict(MEMORY_PROFILES)
+        if budget_mb is not None:
+            profiles[f"budget_{budget_mb}mb"] = {"dtype": np.float32, "memory_budget_mb": budget_mb}
+
+        exact, exact_time = _timed(ContentRecommender, df)
+        for name, params in profiles.items():
+            rec, build_time = (exact, exact_time) if name == "exact" else _timed(ContentRecommender, df, **params)
+            footprint = rec.memory_footprint()
+            rows.append({
+                "n_tracks": n,
+                "profile": name,
+                "build_s": build_time,
+                "n_features": rec.tfidf_matrix.shape[1],
+                "matrix_mb": footprint["matrix"] / 2 ** 20,
+                "vocabulary_mb": footprint["vocabulary"] / 2 ** 20,
+                "total_mb": footprint["total"] / 2 ** 20,
+                f"overlap@{top_k}": neighbor_overlap(exact, rec, sample, top_k=top_k),
+            })
+    return pd.DataFrame(rows)
+
+def bench_evaluation(sizes, sample_size=10_000, top_k=10, n_jobs=None):
+    """Rapport d'évaluation (cohérence, latences, recall@k) sur catalogue synthétique."""
+    rows = []
+    for n in sizes:
+        rec = ContentRecommender(make_synthetic_catalog(n))
+        report, total_time = _timed(evaluation_report, rec, sample_size=sample_size, top_k=top_k, n_jobs=n_jobs)
+        rows.append({"n_tracks": n, "total_s": total_time, **report})
+    return pd.DataFrame(rows)
+
+def bench_search(sizes, n_queries=200, n_neighbors=30):
+    """
+    Recherche top-k : NearestNeighbors(cosine, brute) historique
+    vs produit scalaire sparse (SparseCosineSearch).
+    """
+    rows = []
+    for n in sizes:
+        rec = ContentRecommender(make_synthetic_catalog(n), dtype=np.float32)
+        query_rows = np.random.default_rng(0).choice(rec.item_matrix.shape[0], min(n_queries, n), replace=False)
+
+        legacy, legacy_fit = _timed(NearestNeighbors(metric="cosine", algorithm="brute").fit, rec.item_matrix)
+        timings = {"legacy": [], "sparse_dot": []}
+        agree = []
+        for row in query_rows:
+            query = rec.item_matrix[row]
+            (old_dist, _), old_time = _timed(legacy.kneighbors, query, n_neighbors=n_neighbors)
+            (new_dist, _), new_time = _timed(rec.nn.kneighbors, query, n_neighbors=n_neighbors)
+            timings["legacy"].append(old_time)
+            timings["sparse_dot"].append(new_time)
+            # on compare les similarités (les ex-aequo peuvent être ordonnés différemment)
+            agree.append(np.allclose(old_dist, new_dist, atol=1e-5))
+
+        legacy_ms = np.mean(timings["legacy"]) * 1000
+        new_ms = np.mean(timings["sparse_dot"]) * 1000
+        rows.append({"n_tracks": n, "legacy_fit_s": legacy_fit,
+                     "legacy_ms": legacy_ms, "legacy_p99_ms": np.percentile(timings["legacy"], 99) * 1000,
+                     "sparse_dot_ms": new_ms, "sparse_dot_p99_ms": np.percentile(timings["sparse_dot"], 99) * 1000,
+                     "speedup": legacy_ms / new_ms, "same_scores": float(np.mean(agree))})
+    return pd.DataFrame(rows)
+
+def bench_dense(sizes, dims=(64, 128, 256), n_queries=2000, top_k=10, n_neighbors=30):
+    """
+    Embeddings denses SVD vs recherche sparse exacte : temps d'ajustement,
+    latence d'une requête kNN, coût par piste en mode groupé (recommend_many),
+    mémoire et recall@k pour chaque dimension.
+    """
+    rows = []
+    for n in sizes:
+        rec = ContentRecommender(make_synthetic_catalog(n), dtype=np.float32)
+        query_rows = np.random.default_rng(0).choice(rec.item_matrix.shape[0], min(n_queries, n), replace=False)
+        sample = rec.df["track_id"].values[query_rows]
+
+        sparse_times = [_timed(rec.nn.kneighbors, rec.item_matrix[row], n_neighbors=n_neighbors)[1]
+                        for row in query_rows]
+        sparse_ms = np.mean(sparse_times) * 1000
+        _, sparse_batch = _timed(rec.recommend_many, sample, top_k=top_k)
+        rows.append({"n_tracks": n, "mode": "sparse", "fit_s": 0.0, "query_ms": sparse_ms,
+                     "batch_ms_per_query": sparse_batch * 1000 / len(sample),
+                     "index_mb": rec.nn.nbytes / 2 ** 20, f"recall@{top_k}": 1.0})
+
+        for dim in dims:
+            _, fit_time = _timed(rec.build_dense_embeddings, dim)
+            dense_times = [_timed(rec.dense_nn.kneighbors, rec.dense_embeddings[row:row + 1],
+                                  n_neighbors=n_neighbors)[1] for row in query_rows]
+            _, dense_batch = _timed(rec.with_search_mode("dense").recommend_many, sample, top_k=top_k)
+            rows.append({"n_tracks": n, "mode": f"dense_{dim}", "fit_s": fit_time,
+                         "query_ms": np.mean(dense_times) * 1000,
+                         "batch_ms_per_query": dense_batch * 1000 / len(sample),
+                         "index_mb": rec.dense_nn.nbytes / 2 ** 20,
+                         f"recall@{top_k}": dense_recall(rec, sample, top_k=top_k)})
+    return pd.DataFrame(rows)
+
+def bench_fields(sizes, sample_size=2000, top_k=10):
+    """
+    Document unique à tokens répétés ("concat") vs un vectoriseur par champ
+    ("fields") : temps d'ajustement, taille de la matrice et cohérence.
+    """
+    rows = []
+    for n in sizes:
+        df = make_synthetic_catalog(n)
+        for text_mode in ("concat", "fields"):
+            rec, build_time = _timed(ContentRecommender, df, dtype=np.float32, text_mode=text_mode)
+            footprint = rec.memory_footprint()
+            coherence = evaluate_coherence(rec, sample_size=sample_size, top_k=top_k)
+            rows.append({
+                "n_tracks": n,
+                "text_mode": text_mode,
+                "build_s": build_time,
+                "n_features": rec.tfidf_matrix.shape[1],
+                "nnz": rec.tfidf_matrix.nnz,
+                "matrix_mb": footprint["matrix"] / 2 ** 20,
+                "total_mb": footprint["total"] / 2 ** 20,
+                "genre_consistency": coherence["Global_Genre_Consistency"],
+                "avg_score": coherence["Average_Similarity_Score"],
+            })
+    return pd.DataFrame(rows)
+
+# -------------------------
+# Chargement du catalogue depuis la BDD
+# -------------------------
+def legacy_orm_catalog(session):
+    """Ancien chargement : objets ORM, un dict par ligne, puis DataFrame."""
+    from models import ViewTrackMaterialise
+    tracks_data = session.query(ViewTrackMaterialise).all()
+    data_dict = [
+        {column.name: getattr(track, column.name) for column in track.__table__.columns}
+        for track in tracks_data
+    ]
+    return pd.DataFrame(data_dict).fillna('')
+
+def _engine(url):
+    from sqlalchemy import create_engine
+    engine = create_engine(url)
+    if engine.dialect.name == "sqlite":
+        # pas de schéma "sae" en SQLite
+        engine = engine.execution_options(schema_translate_map={"sae": None})
+    return engine
+
+def make_sqlite_catalog(path, n_tracks, seed=42):
+    """Remplit une base SQLite avec une vue catalogue synthétique (toutes les colonnes de la vue)."""
+    from models import ViewTrackMaterialise
+    table = ViewTrackMaterialise.__table__
+    df = make_synthetic_catalog(n_tracks, seed).drop(columns=["genre_title"])
+    # colonnes larges de la vue, lues par l'ancien chemin mais inutiles au moteur
+    df["album_information"] = "<p>" + df["album_title"] + " " + "lorem ipsum " * 20 + "</p>"
+    df["album_handle"] = df["album_title"].str.replace(" ", "_")
+    df["track_duration"] = 180.0
+
+    engine = _engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        table.create(conn)
+        records = df.to_dict("records")
+        for start in range(0, len(records), 50_000):
+            conn.execute(table.insert(), records[start:start + 50_000])
+    engine.dispose()
+
+def _rss_kb(field):
+    """VmRSS (courant) ou VmHWM (pic) du processus, en Ko (Linux)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _reset_peak_rss():
+    # remet VmHWM au RSS courant : le pic mesuré ne compte plus les imports
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def _measure_load(url, method, queue):
+    """Exécuté dans un processus neuf : temps de chargement et pic de RSS."""
+    from sqlalchemy.orm import Session
+    from recommender.catalog import load_catalog
+
+    engine = _engine(url)
+    _reset_peak_rss()
+    baseline = _rss_kb("VmRSS")
+    start = time.perf_counter()
+    with Session(engine) as session:
+        if method == "orm":
+            df = legacy_orm_catalog(session)
+        else:
+            df = load_catalog(session.connection(), method=method)
+    elapsed = time.perf_counter() - start
+    peak = _rss_kb("VmHWM")
+    queue.put({"load_s": elapsed, "peak_rss_mb": peak / 1024, "load_rss_mb": (peak - baseline) / 1024,
+               "df_mb": df.memory_usage(deep=True).sum() / 2 ** 20, "n_rows": len(df)})
+
+def bench_catalog_load(sizes, url=None, methods=None):
+    """
+    Chargement du catalogue : ancien chemin ORM vs lecture en colonnes
+    (curseur serveur, COPY si PostgreSQL). Chaque mesure tourne dans un processus
+    neuf pour que le pic de RSS (ru_maxrss) ne dépende que du chargement mesuré.
+    Sans `url`, une base SQLite synthétique est générée pour chaque taille.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_url = url
+            if db_url is None:
+                make_sqlite_catalog(os.path.join(tmp, "catalog.db"), n)
+                db_url = f"sqlite:///{os.path.join(tmp, 'catalog.db')}"
+            run_methods = methods or (["orm", "cursor", "copy"] if db_url.startswith("postgresql")
+                                      else ["orm", "cursor"])
+            for method in run_methods:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_measure_load, args=(db_url, method, queue))
+                proc.start()
+                result = queue.get()
+                proc.join()
+                rows.append({"n_tracks": n, "method": method, **result})
+    return pd.DataFrame(rows)
+
+# -------------------------
+# Recommandeur GRU : vecteurs sémantiques
+# -------------------------
+def make_synthetic_vectors(n_items, dim=384, n_topics=300, seed=0):
+    """Vecteurs groupés par "thèmes" + scores d'intérêt à longue traîne, comme data_*_109k.pt."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_topics, n_items)]
+    vectors += 0.6 * rng.standard_normal(size=(n_items, dim), dtype=np.float32)
+    interests = (rng.pareto(3, n_items) / 10).clip(0, 1).astype(np.float32)
+    return vectors, interests
+
+def make_synthetic_queries(vectors, n_queries, seed=1):
+    """Vecteurs "envie" normalisés proches du catalogue (sortie du GRU)."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), n_queries)]
+    queries = queries + 0.5 * rng.standard_normal(size=queries.shape, dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def bench_ann(sizes, nprobes=(4, 8, 16, 32), n_queries=200, top_k=10):
+    """Recherche hybride du GRU : exacte vs index IVF (recall@k, latence, mémoire)."""
+    from recommender.ann_index import IVFIndex, hybrid_top_k, hybrid_recall
+    from recommender.vector_store import VectorStore
+
+    rows = []
+    for n in sizes:
+        vectors, interests = make_synthetic_vectors(n)
+        queries = make_synthetic_queries(vectors, n_queries)
+        popular = np.argsort(-interests)[:256]
+        vectors = VectorStore.from_vectors(vectors, copy=False)
+        index, build_time = _timed(IVFIndex.build, vectors)
+
+        exact_ms = np.mean([_timed(hybrid_top_k, q, vectors, interests, top_k)[1] for q in queries]) * 1000
+        rows.append({"n_items": n, "search": "exact", "build_s": 0.0, "query_ms": exact_ms,
+                     "speedup": 1.0, f"recall@{top_k}": 1.0, "index_mb": 0.0})
+        for nprobe in nprobes:
+            index.nprobe = nprobe
+            ann_ms = np.mean([_timed(hybrid_top_k, q, vectors, interests, top_k, index=index,
+                                     extra_candidates=popular)[1] for q in queries]) * 1000
+            rows.append({"n_items": n, "search": f"ivf_{index.n_lists}_nprobe_{nprobe}", "build_s": build_time,
+                         "query_ms": ann_ms, "speedup": exact_ms / ann_ms,
+                         f"recall@{top_k}": hybrid_recall(vectors, interests, index, queries, top_k, popular),
+                         "index_mb": index.nbytes / 2 ** 20})
+    return pd.DataFrame(rows)
+
+def _legacy_cosine_top_k(query, vectors, interests, top_k):
+    """Ancien chemin : cosine_similarity renormalise tout le catalogue à chaque requête."""
+    norms = np.linalg.norm(vectors, axis=1) * max(float(np.linalg.norm(query)), 1e-8)
+    scores = (vectors @ query) / np.maximum(norms, 1e-8) * 0.7 + interests * 0.3
+    return np.argpartition(-scores, top_k)[:top_k]
+
+def bench_vectors(sizes, modes=("float32", "float16", "int8"), n_queries=200, top_k=10, rerank=100):
+    """
+    Stockage des vecteurs GRU par mode : mémoire résidente, latence de la
+    recherche hybride exhaustive et recall@k sans / avec re-classement exact.
+    """
+    import tempfile
+    from recommender.ann_index import hybrid_top_k, hybrid_recall
+    from recommender.vector_store import VectorStore
+
+    rows = []
+    for n in sizes:
+        vectors, interests = make_synthetic_vectors(n)
+        queries = make_synthetic_queries(vectors, n_queries)
+        legacy_ms = np.mean([_timed(_legacy_cosine_top_k, q, vectors, interests, top_k)[1] for q in queries]) * 1000
+        rows.append({"n_items": n, "mode": "legacy_cosine", "resident_mb": vectors.nbytes / 2 ** 20,
+                     "query_ms": legacy_ms, f"recall@{top_k}": 1.0, f"recall@{top_k}_rerank": 1.0})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            VectorStore.from_vectors(vectors, copy=False).save(tmp)
+            del vectors
+            for mode in modes:
+                # copie float32 en memmap : seuls les codes du mode sont résidents
+                store = VectorStore.load(tmp, mode)
+                if mode == "float32":
+                    store = VectorStore(np.array(store.codes))
+                query_ms = np.mean([_timed(hybrid_top_k, q, store, interests, top_k, rerank=rerank)[1]
+                                    for q in queries]) * 1000
+                rows.append({"n_items": n, "mode": mode, "resident_mb": store.nbytes / 2 ** 20,
+                             "query_ms": query_ms,
+                             f"recall@{top_k}": hybrid_recall(store, interests, None, queries[:50], top_k, rerank=0)
+                             if not store.is_exact else 1.0,
+                             f"recall@{top_k}_rerank": hybrid_recall(store, interests, None, queries[:50], top_k,
+                                                                     rerank=rerank)})
+                del store
+    return pd.DataFrame(rows)
+
+def _write_vector_chunks(directory, vectors, chunk_size=60_000):
+    """Ancien format du dépôt : vectors_chunks/vectors_chunk_{i}.pt + chunks_metadata.pt."""
+    import torch
+
+    starts = range(0, len(vectors), chunk_size)
+    for i, start in enumerate(starts):
+        torch.save(torch.from_numpy(vectors[start:start + chunk_size].copy()),
+                   os.path.join(directory, f"vectors_chunk_{i}.pt"))
+    torch.save({"num_chunks": len(starts), "original_shape": list(vectors.shape)},
+               os.path.join(directory, "chunks_metadata.pt"))
+
+def _measure_vector_load(directory, method, queue):
+    """Exécuté dans un processus neuf : ouverture des vecteurs puis une requête exhaustive."""
+    import torch
+    from recommender.vector_store import VectorStore, normalize_rows
+
+    _reset_peak_rss()
+    anon, file = _rss_kb("RssAnon"), _rss_kb("RssFile")
+    start = time.perf_counter()
+    if method == "torch_chunks":
+        metadata = torch.load(os.path.join(directory, "chunks_metadata.pt"))
+        vectors = torch.cat([torch.load(os.path.join(directory, f"vectors_chunk_{i}.pt"))
+                             for i in range(metadata["num_chunks"])], dim=0)
+        store = VectorStore(normalize_rows(vectors.numpy()))
+    else:
+        store = VectorStore.load(directory)
+    load_s = time.perf_counter() - start
+    store.scores(np.ones(store.dim, dtype=np.float32))
+    queue.put({"load_s": load_s, "peak_rss_mb": (_rss_kb("VmHWM") - anon - file) / 1024,
+               "private_mb": (_rss_kb("RssAnon") - anon) / 1024, "shared_mb": (_rss_kb("RssFile") - file) / 1024})
+
+def bench_vector_load(sizes, dim=384):
+    """
+    Démarrage du GRU : torch.load des chunks + torch.cat vs .npy memory-mapped.
+    private_mb : mémoire propre au worker ; shared_mb : pages du fichier, partagées
+    par tous les workers via le cache du système.
+    """
+    from recommender.vector_store import convert_vectors
+
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            vectors, _ = make_synthetic_vectors(n, dim)
+            _write_vector_chunks(tmp, vectors)
+            convert_vectors(iter([vectors]), vectors.shape, tmp)
+            del vectors
+            for method in ("torch_chunks", "memmap"):
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_measure_vector_load, args=(tmp, method, queue))
+                proc.start()
+                result = queue.get()
+                proc.join()
+                rows.append({"n_items": n, "method": method, **result})
+    return pd.DataFrame(rows)
+
+# -------------------------
+# Recommandeur GRU : cache des embeddings de recherche
+# -------------------------
+class _CountingEncoder:
+    """Encodeur factice : compte les textes encodés (coût réel ~ proportionnel)."""
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.n_texts = 0
+        self.n_calls = 0
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        self.n_texts += len(texts)
+        self.n_calls += 1
+        return np.zeros((len(texts), self.dim), dtype=np.float32)
+
+def simulate_search_sessions(n_users, n_requests, vocabulary=20_000, window=20, seed=0):
+    """
+    Fenêtres des 20 dernières recherches vues par /users/gru_recommendations :
+    chaque requête ajoute une recherche (loi de Zipf sur le vocabulaire) à
+    l'historique d'un utilisateur tiré au hasard.
+    """
+    rng = np.random.default_rng(seed)
+    words = [f"requête {i}" for i in range(vocabulary)]
+    histories = [[words[min(int(z), vocabulary) - 1] for z in rng.zipf(1.2, window)] for _ in range(n_users)]
+    for user in rng.integers(0, n_users, n_requests):
+        query = words[min(int(rng.zipf(1.2)), vocabulary) - 1]
+        # casse / espaces variables : même clé normalisée
+        if rng.random() < 0.3:
+            query = f"  {query.upper()} "
+        histories[user] = histories[user][1:] + [query]
+        yield histories[user]
+
+def bench_query_cache(sizes, n_requests=20_000, cache_entries=(1_000, 50_000), warm_up=2_000):
+    """Textes envoyés à l'encodeur par requête : sans cache (20) vs LRU, avec / sans pré-chargement."""
+    from recommender.embedding_cache import EmbeddingCache
+
+    rows = [{"n_users": n, "cache": "none", "warm_up": 0, "encoded_per_request": 20.0, "hit_rate": 0.0}
+            for n in sizes]
+    for n in sizes:
+        for entries in cache_entries:
+            for n_warm in (0, warm_up):
+                encoder = _CountingEncoder()
+                cache = EmbeddingCache(encoder, max_entries=entries)
+                cache.warm_up([f"requête {i}" for i in range(1, n_warm + 1)])
+                encoder.n_texts = 0
+                cache.hits = cache.disk_hits = cache.misses = 0
+                for history in simulate_search_sessions(n, n_requests):
+                    cache.encode(history)
+                rows.append({"n_users": n, "cache": f"lru_{entries}", "warm_up": n_warm,
+                             "encoded_per_request": encoder.n_texts / n_requests,
+                             "hit_rate": cache.stats()["hit_rate"]})
+    return pd.DataFrame(rows)
+
+# -------------------------
+# Recommandeur GRU : micro-batching des requêtes concurrentes
+# -------------------------
+class _HashingEncoder:
+    """Encodeur déterministe bon marché (MiniLM n'est pas nécessaire pour mesurer le reste)."""
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            out[row] = np.random.default_rng(abs(hash(text)) % 2 ** 32).standard_normal(self.dim)
+        return out
+
+def _run_clients(predict, histories, concurrency, n_requests):
+    """`concurrency` threads clients envoient n_requests au total ; latences en secondes."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def one(i):
+        start = time.perf_counter()
+        predict(histories[i % len(histories)], 10)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(one, range(n_requests)))
+        elapsed = time.perf_counter() - start
+    return np.array(latencies), elapsed
+
+def bench_batching(sizes, concurrency=(1, 8, 32, 64), n_requests=640, max_wait_ms=5.0, max_batch=32):
+    """
+    Requêtes GRU concurrentes : predict() par requête vs file de micro-batching
+    (encodage, GRU et produit avec le catalogue faits une fois par paquet).
+    Les historiques sont tous différents et sans état en cache (pire cas).
+    """
+    import torch
+    from recommender.gru_model import MusicRecommender, SemanticGRU
+    from recommender.batching import BatchScheduler
+    from recommender.vector_store import VectorStore
+
+    torch.manual_seed(0)
+    rows = []
+    for n in sizes:
+        vectors, interests = make_synthetic_vectors(n)
+        recommender = MusicRecommender.from_components(
+            _HashingEncoder(), SemanticGRU(), VectorStore.from_vectors(vectors, copy=False), interests, np.arange(n)
+        )
+        del vectors
+        histories = [[f"requête {u} {i}" for i in range(20)] for u in range(n_requests)]
+        recommender.embedding_cache.warm_up([q for h in histories for q in h])
+        recommender.scheduler = BatchScheduler(recommender.predict_many, max_batch, max_wait_ms)
+
+        for c in concurrency:
+            for mode, predict in (("per_request", recommender.predict), ("batched", recommender.predict_batched)):
+                _run_clients(predict, histories, c, min(n_requests, 4 * c))
+                before = recommender.scheduler.stats()
+                latencies, elapsed = _run_clients(predict, histories, c, n_requests)
+                after = recommender.scheduler.stats()
+                batches = after["batches"] - before["batches"]
+                rows.append({"n_items": n, "concurrency": c, "mode": mode,
+                             "throughput_rps": n_requests / elapsed,
+                             "p50_ms": np.percentile(latencies, 50) * 1000,
+                             "p99_ms": np.percentile(latencies, 99) * 1000,
+                             "mean_batch": (after["requests"] - before["requests"]) / batches if batches else 1.0})
+    return pd.DataFrame(rows)
+
+# -------------------------
+# API : routes légères pendant une charge de recommandations
+# -------------------------
+async def _asgi_get(app, path):
+    """Appel GET direct de l'application ASGI (sans serveur HTTP) ; latence en secondes."""
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [], "client": ("bench", 0), "server": ("bench", 80)}
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - start
+
+def bench_routes(sizes, concurrency=(8, 32, 64), n_light=200):
+    """
+    Latence d'une route légère (lecture BDD simulée) pendant `c` recommandations
+    GRU simultanées : handlers `def` dans le pool HTTP (ancien) vs `async def`
+    attendant le pool d'inférence dédié.
+    """
+    import torch
+    from fastapi import FastAPI
+    from recommender.gru_model import MusicRecommender, SemanticGRU
+    from recommender.inference import run_inference, configure_threads
+    from recommender.vector_store import VectorStore
+
+    configure_threads()
+    torch.manual_seed(0)
+    rows = []
+    for n in sizes:
+        vectors, interests = make_synthetic_vectors(n)
+        recommender = MusicRecommender.from_components(
+            _HashingEncoder(), SemanticGRU(), VectorStore.from_vectors(vectors, copy=False), interests, np.arange(n)
+        )
+        del vectors
+        history = [f"requête {i}" for i in range(20)]
+        recommender.embedding_cache.warm_up(history)
+
+        app = FastAPI()
+
+        @app.get("/light")
+        def light():
+            time.sleep(0.002)
+            return {"ok": True}
+
+        @app.get("/reco_sync")
+        def reco_sync():
+            return recommender.predict(history, 10)
+
+        @app.get("/reco_async")
+        async def reco_async():
+            return await run_inference(recommender.predict, history, 10)
+
+        async def scenario(path, c):
+            stop = asyncio.Event()
+            done = 0
+
+            async def client():
+                nonlocal done
+                while not stop.is_set():
+                    await _asgi_get(app, path)
+                    done += 1
+
+            clients = [asyncio.create_task(client()) for _ in range(c)]
+            await asyncio.sleep(0.5)
+            start, done = time.perf_counter(), 0
+            light_latencies = [await _asgi_get(app, "/light") for _ in range(n_light)]
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await asyncio.gather(*clients)
+            return np.array(light_latencies), done / elapsed
+
+        for c in concurrency:
+            for mode, path in (("sync_def", "/reco_sync"), ("async_executor", "/reco_async")):
+                light_latencies, reco_rps = asyncio.run(scenario(path, c))
+                rows.append({"n_items": n, "concurrency": c, "mode": mode, "reco_rps": reco_rps,
+                             "light_p50_ms": np.percentile(light_latencies, 50) * 1000,
+                             "light_p99_ms": np.percentile(light_latencies, 99) * 1000})
+    return pd.DataFrame(rows)
+
+# -------------------------
+# API : cache des recommandations par utilisateur
+# -------------------------
+def simulate_polling(n_users, n_requests, search_probability=0.2, seed=0):
+    """
+    Appels à /users/gru_recommendations : entre deux recherches, le client
+    rappelle la route avec la même fenêtre. Donne (user, fenêtre, nouvelle recherche ?).
+    """
+    rng = np.random.default_rng(seed)
+    histories = [[f"requête {u} {i}" for i in range(20)] for u in range(n_users)]
+    for step, user in enumerate(rng.integers(0, n_users, n_requests)):
+        searched = rng.random() < search_probability
+        if searched:
+            histories[user] = histories[user][1:] + [f"requête {user} n{step}"]
+        yield int(user), histories[user], searched
+
+def bench_result_cache(sizes, n_items=109_000, n_requests=2_000, ttl_seconds=600.0):
+    """Recommandations GRU recalculées à chaque appel vs cache par utilisateur invalidé à chaque recherche."""
+    import torch
+    from recommender.gru_model import MusicRecommender, SemanticGRU
+    from recommender.vector_store import VectorStore
+    from recommender.result_cache import ResultCache, history_key
+    from recommender.embedding_cache import normalize_query
+
+    torch.manual_seed(0)
+    vectors, interests = make_synthetic_vectors(n_items)
+    rows = []
+    for n in sizes:
+        for mode in ("none", "result_cache"):
+            recommender = MusicRecommender.from_components(
+                _HashingEncoder(), SemanticGRU(), VectorStore.from_vectors(vectors, copy=False), interests,
+                np.arange(n_items)
+            )
+            cache = ResultCache(ttl_seconds=ttl_seconds)
+            computed = 0
+            start = time.perf_counter()
+            for user, history, searched in simulate_polling(n, n_requests):
+                if searched:
+                    cache.invalidate_user(user)
+                    recommender.observe_search(user, history[-1])
+                key = history_key(normalize_query(q) for q in history)
+                if mode == "result_cache" and cache.get(user, key, 10) is not None:
+                    continue
+                cache.put(user, key, 10, result=tuple(recommender.predict(history, 10, user_id=user)))
+                computed += 1
+            elapsed = time.perf_counter() - start
+            rows.append({"n_users": n, "mode": mode, "computed_per_request": computed / n_requests,
+                         "hit_rate": cache.stats()["hit_rate"] if mode == "result_cache" else 0.0,
+                         "mean_ms": elapsed / n_requests * 1000})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks des moteurs de recommandation")
+    parser.add_argument("bench", choices=["text_features", "memory", "evaluate", "search", "dense", "fields", "catalog", "ann", "vectors", "vector_load", "query_cache",
+                                          "batching", "routes", "result_cache"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--skip-legacy-above", type=int, default=None,
+                        help="Ne lance pas l'ancienne implémentation au-delà de cette taille")
+    parser.add_argument("--budget-mb", type=float, default=None, help="Budget mémoire testé (bench memory)")
+    parser.add_argument("--sample-size", type=int, default=10_000, help="Pistes évaluées (bench evaluate)")
+    parser.add_argument("--jobs", type=int, default=None, help="Processus d'évaluation (bench evaluate)")
+    parser.add_argument("--url", default=None, help="BDD à lire (bench catalog, défaut : SQLite synthétique)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64],
+                        help="Clients simultanés (bench batching)")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256], help="Dimensions SVD (bench dense)")
+    args = parser.parse_args()
+
+    if args.bench == "text_features":
+        print(bench_text_features(args.sizes, args.skip_legacy_above).to_string(index=False))
+    elif args.bench == "memory":
+        print(bench_memory_profiles(args.sizes, budget_mb=args.budget_mb).to_string(index=False))
+    elif args.bench == "evaluate":
+        print(bench_evaluation(args.sizes, args.sample_size, n_jobs=args.jobs).T.to_string())
+    elif args.bench == "search":
+        print(bench_search(args.sizes).to_string(index=False))
+    elif args.bench == "dense":
+        print(bench_dense(args.sizes, dims=args.dims).to_string(index=False))
+    elif args.bench == "fields":
+        print(bench_fields(args.sizes).to_string(index=False))
+    elif args.bench == "catalog":
+        print(bench_catalog_load(args.sizes, url=args.url).to_string(index=False))
+    elif args.bench == "ann":
+        print(bench_ann(args.sizes).to_string(index=False))
+    elif args.bench == "vectors":
+        print(bench_vectors(args.sizes).to_string(index=False))
+    elif args.bench == "vector_load":
+        print(bench_vector_load(args.sizes).to_string(index=False))
+    elif args.bench == "query_cache":
+        print(bench_query_cache(args.sizes).to_string(index=False))
+    elif args.bench == "batching":
+        print(bench_batching(args.sizes, concurrency=args.concurrency).to_string(index=False))
+    elif args.bench == "routes":
+        print(bench_routes(args.sizes, concurrency=args.concurrency).to_string(index=False))
+    elif args.bench == "result_cache":
+        print(bench_result_cache(args.sizes).to_string(index=False))
@@ -0,0 +1,116 @@
+"""
+Chargement en colonnes du catalogue (view_track_materialise) pour les recommandeurs.
+
+L'ancien chemin (db.query(ViewTrackMaterialise).all(), un dict par ligne puis
+DataFrame) matérialise le catalogue trois fois en mémoire, avec toutes les
+colonnes de la vue. Ici on ne lit que les colonnes utiles au moteur :
+  - "copy"   : COPY (SELECT ...) TO STDOUT (PostgreSQL / psycopg2) lu par pandas
+  - "cursor" : curseur côté serveur lu par paquets, rangés directement en colonnes
+
+Les colonnes très répétées (artiste, album, genres, tags, langues) sont stockées
+en dtype "category". Les valeurs NULL deviennent '' comme avec fillna('').
+"""
+import io
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import select
+
+from models import ViewTrackMaterialise
+
+
+# Colonnes lues pour les recommandeurs (les autres colonnes de la vue sont ignorées)
+CATALOG_COLUMNS = (
+    "track_id", "track_title", "artist_name", "album_title",
+    "track_genre_maj", "genres_list", "tags_list", "languages_list",
+)
+CATEGORICAL_COLUMNS = (
+    "artist_name", "album_title", "track_genre_maj", "genres_list", "tags_list", "languages_list",
+)
+
+
+def _catalog_query(columns, track_ids=None):
+    table = ViewTrackMaterialise.__table__
+    query = select(*[table.c[name] for name in columns])
+    if track_ids is not None:
+        query = query.where(table.c.track_id.in_([int(t) for t in track_ids]))
+    return query
+
+
+def _column_array(values, name, categorical):
+    """Une colonne d'un paquet : int64 pour track_id, catégorie ou objet pour le texte."""
+    if name == "track_id":
+        return np.asarray(values, dtype=np.int64)
+    values = ["" if v is None else v for v in values]
+    if name in categorical:
+        return pd.Categorical(values)
+    return np.asarray(values, dtype=object)
+
+
+def load_catalog_cursor(connection, columns=CATALOG_COLUMNS, track_ids=None,
+                        categorical=CATEGORICAL_COLUMNS, chunk_size=20_000):
+    """
+    Lecture par curseur côté serveur (stream_results) : seules `chunk_size` lignes
+    sont en mémoire sous forme de tuples, chaque paquet est aussitôt converti en
+    tableaux typés par colonne.
+    """
+    # options passées à cette seule requête : Connection.execution_options modifierait
+    # la connexion de la Session (db.connection()) pour toutes les requêtes suivantes
+    result = connection.execute(
+        _catalog_query(columns, track_ids),
+        execution_options={"stream_results": True, "yield_per": chunk_size},
+    )
+    chunks = {name: [] for name in columns}
+    for rows in result.partitions(chunk_size):
+        for name, values in zip(columns, zip(*rows)):
+            chunks[name].append(_column_array(values, name, categorical))
+
+    data = {}
+    for name, parts in chunks.items():
+        if not parts:
+            data[name] = _column_array([], name, categorical)
+        elif name in categorical:
+            data[name] = union_categoricals(parts)
+        else:
+            data[name] = np.concatenate(parts)
+    return pd.DataFrame(data)
+
+
+def load_catalog_copy(connection, columns=CATALOG_COLUMNS, track_ids=None,
+                      categorical=CATEGORICAL_COLUMNS):
+    """
+    Lecture par COPY ... TO STDOUT (CSV) puis parsing C de pandas,
+    directement dans les dtypes finaux. PostgreSQL + psycopg2 uniquement.
+    """
+    sql = str(_catalog_query(columns, track_ids).compile(
+        dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+    ))
+    buffer = io.BytesIO()
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+    finally:
+        cursor.close()
+    buffer.seek(0)
+
+    dtype = {name: ("category" if name in categorical else str) for name in columns}
+    dtype["track_id"] = np.int64
+    # keep_default_na=False : NULL (champ vide) -> '' comme fillna('')
+    return pd.read_csv(buffer, dtype=dtype, keep_default_na=False)
+
+
+def load_catalog(connection, track_ids=None, columns=CATALOG_COLUMNS,
+                 categorical=CATEGORICAL_COLUMNS, method=None):
+    """
+    Charge le catalogue dans un DataFrame typé, éventuellement restreint à des track_id.
+    `connection` : connexion SQLAlchemy (ex : db.connection()).
+    `method` : "copy", "cursor" ou None (COPY si PostgreSQL + psycopg2, sinon curseur).
+    """
+    if method is None:
+        method = "copy" if connection.dialect.driver == "psycopg2" else "cursor"
+    if method == "copy":
+        return load_catalog_copy(connection, columns, track_ids, categorical)
+    if method == "cursor":
+        return load_catalog_cursor(connection, columns, track_ids, categorical)
+    raise ValueError(f"Méthode de chargement inconnue : {method}")
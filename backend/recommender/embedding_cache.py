@@ -0,0 +1,133 @@
+"""
+Cache des embeddings MiniLM des recherches pour le recommandeur GRU.
+
+Chaque appel à /users/gru_recommendations ré-encodait les 20 dernières
+recherches de l'utilisateur, alors que presque toutes l'avaient déjà été à la
+requête précédente, et que les recherches populaires reviennent d'un
+utilisateur à l'autre. Ici :
+  - une LRU bornée en mémoire (texte normalisé -> vecteur float32)
+  - un second niveau optionnel sur disque (SQLite), conservé entre deux
+    redémarrages et partagé par les workers
+  - seuls les textes absents des deux niveaux sont envoyés à l'encodeur,
+    en un seul batch
+"""
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """Clé du cache : casse, espaces et forme Unicode n'influent pas sur l'embedding (modèle uncased)."""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingCache:
+    """
+    encoder     : objet exposant encode(list[str]) (SentenceTransformer)
+    max_entries : taille maximale de la LRU en mémoire
+    disk_path   : base SQLite du second niveau (None = mémoire seule)
+    namespace   : variante de l'encodeur (ex : int8) ; ses vecteurs sont rangés à part sur disque
+    """
+    def __init__(self, encoder, max_entries=50_000, disk_path=None, namespace=""):
+        self.encoder = encoder
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # appelé depuis plusieurs threads (file de batching, tâches de fond)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        self._table = f"query_embedding_{namespace}" if namespace else "query_embedding"
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (query TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # -------------------------
+    # Niveaux du cache
+    # -------------------------
+    def _get(self, key):
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+        return vector
+
+    def _put(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, keys):
+        if self._db is None or not keys:
+            return {}
+        found = {}
+        # SQLite limite le nombre de paramètres par requête
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT query, vector FROM {self._table} WHERE query IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _disk_put(self, items):
+        if self._db is None or not items:
+            return
+        self._db.executemany(f"INSERT OR REPLACE INTO {self._table} VALUES (?, ?)",
+                             [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items])
+        self._db.commit()
+
+    # -------------------------
+    # Encodage
+    # -------------------------
+    def encode(self, queries):
+        """Embeddings [len(queries), d] float32, dans l'ordre des requêtes."""
+        keys = [normalize_query(q) for q in queries]
+        vectors = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._get(key)
+                if vector is not None:
+                    vectors[key] = vector
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            on_disk = self._disk_get(missing)
+            for key, vector in on_disk.items():
+                self._put(key, vector)
+            vectors.update(on_disk)
+            self.hits += sum(key in vectors and key not in on_disk for key in keys)
+            self.disk_hits += sum(key in on_disk for key in keys)
+
+        to_encode = [key for key in missing if key not in on_disk]
+        if to_encode:
+            encoded = np.asarray(self.encoder.encode(to_encode, convert_to_numpy=True), dtype=np.float32)
+            with self._lock:
+                self.misses += sum(key not in vectors for key in keys)
+                for key, vector in zip(to_encode, encoded):
+                    self._put(key, vector)
+                    vectors[key] = vector
+                self._disk_put(zip(to_encode, encoded))
+        return np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    def warm_up(self, queries, batch_size=256):
+        """Pré-charge les requêtes (ex : les plus fréquentes de search_history), par batchs."""
+        queries = [q for q in queries if q]
+        for start in range(0, len(queries), batch_size):
+            self.encode(queries[start:start + batch_size])
+        return len(self)
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {"entries": len(self), "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0}
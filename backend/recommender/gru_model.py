@@ -6,9 +6,57 @@ import torch
 import torch.nn as nn
 from sentence_transformers import SentenceTransformer
 import pandas as pd
+import numpy as np
 import os
+import time
+from contextlib import contextmanager
 from typing import List, Optional
 
+from recommender.ann_index import ANN_INDEX_FILE, IVFIndex, load_ann_index, hybrid_top_k_many
+from recommender.vector_store import VectorStore, convert_vectors, store_exists, top_n
+from recommender.embedding_cache import EmbeddingCache, normalize_query
+from recommender.user_state import UserStateCache
+from recommender.batching import BatchScheduler
+from recommender.optimized import OPTIMIZED_DIR, load_optimized_gru, optimize_encoder
+
+
+# Recherche dans les vecteurs : "exact" ou "ann" (index IVF construit et validé
+# par build_gru_index.py, qui refuse un index dont le recall est insuffisant)
+GRU_SEARCH_MODE = os.getenv("GRU_SEARCH_MODE", "exact")
+# Listes IVF sondées par requête (plus = meilleur rappel, plus lent)
+GRU_ANN_NPROBE = int(os.getenv("GRU_ANN_NPROBE", "16"))
+# Candidats notés par le score hybride, plus les titres les plus populaires
+GRU_ANN_CANDIDATES = 200
+GRU_POPULAR_CANDIDATES = 256
+
+# Stockage des vecteurs : "float32", "float16" ou "int8" (voir recommender.vector_store)
+GRU_VECTOR_MODE = os.getenv("GRU_VECTOR_MODE", "float32")
+# Candidats re-notés exactement en mode quantifié
+GRU_RERANK = 100
+VECTOR_STORE_DIR = "vector_store"
+# track_id de chaque ligne des vecteurs (int64), extrait de data_metadata_109k.pkl
+TRACK_IDS_FILE = "track_ids.npy"
+
+# Cache des embeddings de recherche : entrées en mémoire et, si un chemin est
+# donné, base SQLite partagée entre workers et redémarrages (défaut : mémoire seule)
+GRU_EMBEDDING_CACHE_SIZE = int(os.getenv("GRU_EMBEDDING_CACHE_SIZE", "50000"))
+GRU_EMBEDDING_CACHE_DB = os.getenv("GRU_EMBEDDING_CACHE_DB", "")
+
+# Fenêtre de recherches lue par les routes GRU de main.py (20 dernières)
+GRU_HISTORY_WINDOW = 20
+# États cachés GRU gardés en mémoire, et fichier de sauvegarde optionnel ("" = aucun)
+GRU_STATE_CACHE_SIZE = int(os.getenv("GRU_STATE_CACHE_SIZE", "100000"))
+GRU_STATE_FILE = os.getenv("GRU_STATE_FILE", "")
+
+# Micro-batching des requêtes concurrentes (GRU_MAX_BATCH <= 1 : pas de regroupement)
+GRU_MAX_BATCH = int(os.getenv("GRU_MAX_BATCH", "32"))
+GRU_BATCH_WAIT_MS = float(os.getenv("GRU_BATCH_WAIT_MS", "5"))
+
+# Inférence : "float" (modèles d'origine) ou "optimized" (int8 + TorchScript, voir recommender.optimized)
+GRU_INFERENCE_MODE = os.getenv("GRU_INFERENCE_MODE", "float")
+# Longueur maximale (tokens) des recherches encodées en mode optimisé
+GRU_ENCODER_MAX_SEQ_LEN = int(os.getenv("GRU_ENCODER_MAX_SEQ_LEN", "32"))
+
 
 class SemanticGRU(nn.Module):
     """
@@ -33,6 +81,84 @@ class SemanticGRU(nn.Module):
         prediction = self.fc(last_step)
         return torch.nn.functional.normalize(prediction, p=2, dim=1)
 
+    def advance(self, x, hidden=None, lengths=None):
+        """
+        Fait avancer l'état caché [num_layers, batch, hidden_dim] sur la séquence x
+        (depuis un état nul si hidden est None). Avec `lengths`, x est un batch
+        complété [batch, max_len, 384] et le padding est ignoré. Retourne le nouvel état.
+        """
+        if lengths is not None:
+            x = nn.utils.rnn.pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+        _, hidden = self.gru(x, hidden)
+        return hidden
+
+    def head(self, last_step):
+        """Vecteur "envie" normalisé à partir de la sortie de la dernière couche [batch, hidden_dim]."""
+        return torch.nn.functional.normalize(self.fc(last_step), p=2, dim=1)
+
+
+def default_paths():
+    """(dossier recommender/, dossier SystemeIA de R&D) où sont cherchés les fichiers du modèle."""
+    base_path = os.path.dirname(__file__)
+    systemeia_path = os.path.join(os.path.dirname(base_path), "..", "..", "..", "..", "..", "SystemeIA")
+    return base_path, systemeia_path
+
+def find_model_file(filename: str, base_path: str, systemeia_path: str) -> Optional[str]:
+    """Cherche un fichier du modèle dans recommender/, vectors_chunks/ puis SystemeIA."""
+    # 1. Dossier courant (recommender/)
+    path1 = os.path.join(base_path, filename)
+    if os.path.exists(path1): return path1
+    # 2. Dossier chunks (recommender/vectors_chunks/)
+    path2 = os.path.join(base_path, "vectors_chunks", filename)
+    if os.path.exists(path2): return path2
+    # 3. Dossier SystemeIA (R&D)
+    path3 = os.path.normpath(os.path.join(systemeia_path, filename))
+    if os.path.exists(path3): return path3
+    return None
+
+def vector_chunks(base_path: str, systemeia_path: str):
+    """
+    Source .pt des vecteurs musicaux, lue paquet par paquet (jamais de torch.cat).
+    Retourne (forme [n, d], itérateur de tenseurs, chemin de la source).
+    """
+    # Option 1 : Fichier complet dans SystemeIA
+    full_path = os.path.normpath(os.path.join(systemeia_path, "data_vectors_109k.pt"))
+    if os.path.exists(full_path):
+        vectors = torch.load(full_path, map_location='cpu')
+        return tuple(vectors.shape), iter([vectors]), full_path
+    
+    # Option 2 : Chunks découpés
+    chunks_dir = os.path.join(base_path, "vectors_chunks")
+    metadata_path = os.path.join(chunks_dir, "chunks_metadata.pt")
+    
+    if os.path.exists(metadata_path):
+        metadata = torch.load(metadata_path, map_location='cpu')
+        chunk_paths = [os.path.join(chunks_dir, f"vectors_chunk_{i}.pt") for i in range(metadata["num_chunks"])]
+        chunks = (torch.load(path, map_location='cpu') for path in chunk_paths)
+        return tuple(metadata["original_shape"]), chunks, chunks_dir
+    
+    # Option 3 : Fichier local direct
+    local_path = os.path.join(base_path, "data_vectors_109k.pt")
+    if os.path.exists(local_path):
+        vectors = torch.load(local_path, map_location='cpu')
+        return tuple(vectors.shape), iter([vectors]), local_path
+    
+    raise FileNotFoundError("Aucune source de vecteurs musicaux trouvée !")
+
+
+def convert_track_ids(meta_file: str, directory: str) -> np.ndarray:
+    """
+    Extrait la colonne track_id du DataFrame de métadonnées (pickle) dans
+    `directory`/track_ids.npy : le DataFrame complet n'est plus chargé ensuite.
+    """
+    track_ids = pd.read_pickle(meta_file)["track_id"].to_numpy(dtype=np.int64)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, TRACK_IDS_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, track_ids)
+    os.replace(tmp_path, path)
+    return track_ids
+
 
 class MusicRecommender:
     """
@@ -53,6 +179,7 @@ class MusicRecommender:
         
         self._initialized = True
         self.is_ready = False
+        self.components = {}
         
         try:
             self._load_components()
@@ -60,133 +187,295 @@ class MusicRecommender:
         except Exception as e:
             print(f"⚠️ Erreur lors de l'initialisation du recommandeur : {e}")
             self.is_ready = False
+
+    @classmethod
+    def load(cls, components: Optional[dict] = None) -> "MusicRecommender":
+        """
+        Nouveau chargement du singleton (y compris après un échec) ; lève
+        l'exception du composant fautif. `components` reçoit, au fil du
+        chargement, l'état et la durée de chaque composant.
+        """
+        recommender = object.__new__(cls)
+        recommender._initialized = True
+        recommender.is_ready = False
+        recommender.components = components if components is not None else {}
+        recommender._load_components()
+        recommender.is_ready = True
+        cls._instance = recommender
+        return recommender
+
+    @contextmanager
+    def _component(self, name: str):
+        """Chronomètre le chargement d'un composant (rapporté par /health/ready)."""
+        self.components[name] = {"state": "loading"}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.components[name] = {"state": "failed", "seconds": round(time.perf_counter() - start, 3),
+                                     "error": str(e)}
+            raise
+        self.components[name] = {"state": "ready", "seconds": round(time.perf_counter() - start, 3)}
     
     def _load_components(self):
         """Charge tous les composants du système"""
         print("🔄 Initialisation du système de recommandation...")
         
-        base_path = os.path.dirname(__file__)
-        systemeia_path = os.path.join(os.path.dirname(base_path), "..", "..", "..", "..", "..", "SystemeIA")
-        chunks_path = os.path.join(base_path, "vectors_chunks")
+        base_path, systemeia_path = default_paths()
         
         # 1. Encodeur BERT
         print("   → Chargement du modèle BERT...")
-        self.encoder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        with self._component("encoder"):
+            self.encoder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
         
-        # 2. Vecteurs de la base musicale
+        # 2. Vecteurs de la base musicale (memory-map, partagés entre workers)
         print("   → Chargement des vecteurs musicaux...")
-        self.db_vectors = self._load_vectors(base_path, systemeia_path)
+        with self._component("vectors"):
+            self.vector_store = self._open_vector_store(base_path, systemeia_path)
         
-        # Fonctions utilitaires pour chercher les fichiers
         def find_file(filename):
-            # 1. Dossier courant (recommender/)
-            path1 = os.path.join(base_path, filename)
-            if os.path.exists(path1): return path1
-            # 2. Dossier chunks (recommender/vectors_chunks/)
-            path2 = os.path.join(chunks_path, filename)
-            if os.path.exists(path2): return path2
-            # 3. Dossier SystemeIA (R&D)
-            path3 = os.path.normpath(os.path.join(systemeia_path, filename))
-            if os.path.exists(path3): return path3
-            return None
+            return find_model_file(filename, base_path, systemeia_path)
 
         # 3. Scores d'intérêt (popularité)
-        interest_file = find_file("data_interest_109k.pt")
-        if not interest_file: raise FileNotFoundError("data_interest_109k.pt introuvable")
-        self.db_interests = torch.load(interest_file, map_location='cpu')
+        with self._component("interests"):
+            interest_file = find_file("data_interest_109k.pt")
+            if not interest_file: raise FileNotFoundError("data_interest_109k.pt introuvable")
+            self.db_interests = torch.load(interest_file, map_location='cpu').numpy().astype(np.float32)
+
+        # 3 bis. Index approché (construit hors ligne par build_gru_index.py)
+        self.ann_index_path = os.path.join(base_path, ANN_INDEX_FILE)
+        self.ann_index = None
+        if GRU_SEARCH_MODE == "ann":
+            with self._component("ann_index"):
+                self.ann_index = load_ann_index(self.ann_index_path, self.vector_store, nprobe=GRU_ANN_NPROBE)
         
-        # 4. Métadonnées
-        meta_file = find_file("data_metadata_109k.pkl")
-        if not meta_file: raise FileNotFoundError("data_metadata_109k.pkl introuvable")
-        self.df_meta = pd.read_pickle(meta_file)
+        # 4. Métadonnées : seul le track_id de chaque ligne est utile
+        with self._component("track_ids"):
+            track_ids_file = os.path.join(base_path, VECTOR_STORE_DIR, TRACK_IDS_FILE)
+            if os.path.exists(track_ids_file):
+                self.track_ids = np.load(track_ids_file)
+            else:
+                meta_file = find_file("data_metadata_109k.pkl")
+                if not meta_file: raise FileNotFoundError("data_metadata_109k.pkl introuvable")
+                self.track_ids = convert_track_ids(meta_file, os.path.join(base_path, VECTOR_STORE_DIR))
+            if len(self.track_ids) != len(self.vector_store):
+                raise ValueError(f"{len(self.track_ids)} track_id pour {len(self.vector_store)} vecteurs")
         
         # 5. Modèle GRU
         print("   → Chargement du modèle GRU...")
-        self.model = SemanticGRU(input_dim=384, hidden_dim=256, output_dim=384)
-        
-        model_file = find_file("modele_gru_109k.pth")
-        if not model_file: raise FileNotFoundError("modele_gru_109k.pth introuvable")
-        self.model.load_state_dict(torch.load(model_file, map_location=torch.device('cpu')))
-        self.model.eval()
+        with self._component("gru"):
+            self.model = SemanticGRU(input_dim=384, hidden_dim=256, output_dim=384)
+            
+            model_file = find_file("modele_gru_109k.pth")
+            if not model_file: raise FileNotFoundError("modele_gru_109k.pth introuvable")
+            self.model.load_state_dict(torch.load(model_file, map_location=torch.device('cpu')))
+            self.model.eval()
+
+        if GRU_INFERENCE_MODE == "optimized":
+            print("   → Mode d'inférence optimisé (int8 + TorchScript)...")
+            with self._component("optimized"):
+                self.model = load_optimized_gru(self.model, model_file, os.path.join(base_path, OPTIMIZED_DIR))
+                self.encoder = optimize_encoder(self.encoder, GRU_ENCODER_MAX_SEQ_LEN)
+
+        self._init_runtime()
+        if GRU_STATE_FILE and os.path.exists(GRU_STATE_FILE):
+            with self._component("user_states"):
+                print(f"   → {self.user_states.load(GRU_STATE_FILE)} états utilisateurs restaurés")
         
-        print(f"✅ Recommandeur prêt ({len(self.df_meta)} titres disponibles)")
+        search = f"IVF, {self.ann_index.n_lists} listes" if self.ann_index is not None else "exacte"
+        print(f"✅ Recommandeur prêt ({len(self.track_ids)} titres disponibles, recherche {search})")
     
-    def _load_vectors(self, base_path: str, systemeia_path: str) -> torch.Tensor:
+    def _init_runtime(self):
+        """Caches et file de batching construits autour des composants chargés."""
+        # les embeddings de l'encodeur int8 ne sont pas mélangés à ceux du float sur disque
+        namespace = f"int8_{GRU_ENCODER_MAX_SEQ_LEN}" if GRU_INFERENCE_MODE == "optimized" else ""
+        self.embedding_cache = EmbeddingCache(self.encoder, GRU_EMBEDDING_CACHE_SIZE,
+                                              disk_path=GRU_EMBEDDING_CACHE_DB or None, namespace=namespace)
+        self.user_states = UserStateCache(GRU_STATE_CACHE_SIZE)
+        # les titres très populaires peuvent l'emporter hors du voisinage sémantique
+        self.popular_candidates = top_n(self.db_interests, GRU_POPULAR_CANDIDATES)
+        self.scheduler = BatchScheduler(self.predict_many, GRU_MAX_BATCH, GRU_BATCH_WAIT_MS) \
+            if GRU_MAX_BATCH > 1 else None
+
+    @classmethod
+    def from_components(cls, encoder, model, vector_store, interests, track_ids, ann_index=None):
+        """Recommandeur hors singleton à partir de composants déjà chargés (benchmarks)."""
+        recommender = object.__new__(cls)
+        recommender._initialized = True
+        recommender.encoder, recommender.model = encoder, model.eval()
+        recommender.vector_store, recommender.db_interests = vector_store, interests
+        recommender.track_ids, recommender.ann_index = np.asarray(track_ids, dtype=np.int64), ann_index
+        recommender._init_runtime()
+        recommender.is_ready = True
+        return recommender
+
+    def _open_vector_store(self, base_path: str, systemeia_path: str) -> VectorStore:
         """
-        Charge les vecteurs depuis les chunks ou le fichier original
+        Ouvre recommender/vector_store/ (vecteurs normalisés en .npy, memory-mapped) :
+        ni désérialisation ni copie, les pages sont partagées par tous les workers.
+        Au premier démarrage, le stockage est converti depuis les fichiers .pt.
         """
-        # Option 1 : Fichier complet dans SystemeIA
-        full_path = os.path.join(systemeia_path, "data_vectors_109k.pt")
-        if os.path.exists(full_path):
-            return torch.load(full_path, map_location='cpu')
-        
-        # Option 2 : Chunks découpés
-        chunks_dir = os.path.join(base_path, "vectors_chunks")
-        metadata_path = os.path.join(chunks_dir, "chunks_metadata.pt")
-        
-        if os.path.exists(metadata_path):
-            print("   → Reconstruction depuis les chunks...")
-            metadata = torch.load(metadata_path, map_location='cpu')
-            
-            chunks = []
-            for i in range(metadata["num_chunks"]):
-                chunk_path = os.path.join(chunks_dir, f"vectors_chunk_{i}.pt")
-                chunk = torch.load(chunk_path, map_location='cpu')
-                chunks.append(chunk)
-            
-            return torch.cat(chunks, dim=0)
-        
-        # Option 3 : Fichier local direct
-        local_path = os.path.join(base_path, "data_vectors_109k.pt")
-        if os.path.exists(local_path):
-            return torch.load(local_path, map_location='cpu')
-        
-        raise FileNotFoundError("Aucune source de vecteurs musicaux trouvée !")
+        directory = os.path.join(base_path, VECTOR_STORE_DIR)
+        if not store_exists(directory):
+            print("   → Conversion des vecteurs au format memory-map...")
+            shape, chunks, source = vector_chunks(base_path, systemeia_path)
+            convert_vectors(chunks, shape, directory, source=source)
+
+        store = VectorStore.load(directory, GRU_VECTOR_MODE)
+        if not store.is_exact:
+            print(f"   → Vecteurs {GRU_VECTOR_MODE} : {store.nbytes / 2 ** 20:.0f} Mo")
+        return store
     
-    def predict(self, search_history: List[str], top_k: int = 10) -> List[int]:
+    def _full_states(self, histories: List[List[str]]) -> torch.Tensor:
+        """
+        États cachés [num_layers, batch, hidden_dim] après chaque séquence, depuis un état nul.
+        Toutes les recherches du batch sont encodées ensemble, puis le GRU tourne
+        une seule fois sur les séquences complétées (packed : le padding est ignoré).
+        """
+        # Encodage BERT des recherches (seules les recherches absentes du cache)
+        lengths = [len(history) for history in histories]
+        input_vectors = torch.from_numpy(self.embedding_cache.encode([q for h in histories for q in h]))
+        sequences = torch.split(input_vectors, lengths)
+        if len(sequences) == 1:
+            return self.model.advance(sequences[0].unsqueeze(0))  # [1, seq_len, 384]
+        input_tensor = nn.utils.rnn.pad_sequence(sequences, batch_first=True)  # [b, max_len, 384]
+        return self.model.advance(input_tensor, lengths=torch.tensor(lengths))
+
+    def _full_state(self, search_history: List[str]) -> torch.Tensor:
+        """État caché [num_layers, hidden_dim] après toute la séquence, depuis un état nul."""
+        return self._full_states([search_history])[:, 0, :]
+
+    def observe_search(self, user_id: int, query: str) -> None:
+        """
+        Nouvelle recherche enregistrée (POST /SearchHistory) : l'état en cache de
+        l'utilisateur avance d'un pas. Si la fenêtre était pleine, elle glisse et
+        l'état est recalculé sur la nouvelle fenêtre.
+        """
+        entry = self.user_states.peek(user_id)
+        if not self.is_ready or entry is None or not query:
+            return
+        window, state = entry
+        window = window + (normalize_query(query),)
+        
+        with torch.no_grad():
+            if len(window) <= GRU_HISTORY_WINDOW:
+                input_vector = torch.from_numpy(self.embedding_cache.encode([query]))
+                state = self.model.advance(input_vector.unsqueeze(0), state.unsqueeze(1).contiguous())[:, 0, :]
+            else:
+                window = window[-GRU_HISTORY_WINDOW:]
+                state = self._full_state(list(window))
+        self.user_states.put(user_id, window, state)
+
+    def save_user_states(self, path: str = GRU_STATE_FILE) -> int:
+        """Sauvegarde les états utilisateurs (rechargés au prochain démarrage)."""
+        return self.user_states.save(path) if path else 0
+
+    def predict(self, search_history: List[str], top_k: int = 10, user_id: Optional[int] = None) -> List[int]:
         """
         Génère des recommandations basées sur l'historique de recherche.
         
         Args:
             search_history: Liste des recherches (ordre chronologique, ancien → récent)
             top_k: Nombre de recommandations à retourner
+            user_id: Utilisateur concerné : son état GRU en cache est réutilisé
+                     s'il correspond exactement à search_history
             
         Returns:
             Liste de track_id recommandés
         """
+        return self.predict_many([(search_history, top_k, user_id)])[0]
+
+    def predict_batched(self, search_history: List[str], top_k: int = 10, user_id: Optional[int] = None) -> List[int]:
+        """predict() via la file de micro-batching : regroupé avec les requêtes concurrentes."""
+        if self.scheduler is None or not self.is_ready or not search_history:
+            return self.predict(search_history, top_k, user_id)
+        return self.scheduler((search_history, top_k, user_id))
+
+    def predict_many(self, requests: List[tuple]) -> List[List[int]]:
+        """
+        Recommandations pour un batch de requêtes (search_history, top_k, user_id).
+        Un seul encodage, une seule passe GRU et un seul produit matriciel avec
+        le catalogue pour tout le batch.
+        """
+        results = [[] for _ in requests]
         if not self.is_ready:
-            return []
-        
-        if not search_history:
-            return []
+            return results
+        active = [i for i, (history, _, _) in enumerate(requests) if history]
+        if not active:
+            return results
         
         with torch.no_grad():
-            # 1. Encodage BERT des recherches
-            input_vectors = self.encoder.encode(search_history, convert_to_tensor=True)
-            input_tensor = input_vectors.unsqueeze(0)  # [1, seq_len, 384]
+            # 1-2. État GRU après chaque séquence : en cache, sinon calcul complet (en batch)
+            windows = {i: [normalize_query(q) for q in requests[i][0]] for i in active}
+            states = {}
+            for i in active:
+                user_id = requests[i][2]
+                state = self.user_states.get(user_id, windows[i]) if user_id is not None else None
+                if state is not None:
+                    states[i] = state
+            todo = [i for i in active if i not in states]
+            if todo:
+                computed = self._full_states([requests[i][0] for i in todo])
+                for column, i in enumerate(todo):
+                    states[i] = computed[:, column, :].clone()
+                    if requests[i][2] is not None:
+                        self.user_states.put(requests[i][2], windows[i], states[i])
             
-            # 2. Prédiction du vecteur "envie"
-            user_vibe_vector = self.model(input_tensor)  # [1, 384]
+            # Prédiction des vecteurs "envie" (sortie de la dernière couche)
+            user_vibe_vectors = self.model.head(torch.stack([states[i][-1] for i in active]))  # [b, 384]
             
-            # 3. Similarité cosinus avec toute la base
-            similarities = torch.nn.functional.cosine_similarity(
-                user_vibe_vector, 
-                self.db_vectors
+            # 3-5. Score hybride (70% sémantique + 30% popularité) puis Top-K :
+            # un produit matriciel sur les vecteurs déjà normalisés, ou les
+            # listes sondées de l'index IVF (+ les titres les plus populaires)
+            top_k = max(requests[i][1] for i in active)
+            top_indices = hybrid_top_k_many(
+                user_vibe_vectors.numpy(), self.vector_store, self.db_interests, top_k,
+                semantic_weight=0.7, popularity_weight=0.3, index=self.ann_index,
+                n_candidates=GRU_ANN_CANDIDATES, extra_candidates=self.popular_candidates,
+                rerank=GRU_RERANK
             )
             
-            # 4. Score hybride (70% sémantique + 30% popularité)
-            final_scores = (similarities * 0.7) + (self.db_interests * 0.3)
-            
-            # 5. Top-K
-            top_indices = torch.topk(final_scores, top_k).indices.tolist()
-            
-            # 6. Extraction des track_id
-            recommendations = [
-                int(self.df_meta.iloc[idx]['track_id']) 
-                for idx in top_indices
-            ]
+            # 6. Extraction des track_id (une seule indexation du tableau aligné)
+            for i, indices in zip(active, top_indices):
+                results[i] = self.track_ids[indices[:requests[i][1]]].tolist()
         
-        return recommendations
+        return results
+
+    def warm_up(self, n_passes: int = 3) -> None:
+        """
+        Passe d'inférence factice avant la première requête : encodeur, GRU
+        (plusieurs passes : TorchScript optimise après ses exécutions de
+        profilage) et recherche dans le catalogue, pages memory-mapped lues.
+        Les caches d'embeddings et d'états utilisateurs ne sont pas touchés.
+        """
+        queries = [f"warm-up {i}" for i in range(GRU_HISTORY_WINDOW)]
+        self.vector_store.touch()
+        with torch.no_grad():
+            vectors = torch.from_numpy(np.asarray(self.encoder.encode(queries, convert_to_numpy=True), dtype=np.float32))
+            for _ in range(n_passes):
+                states = self.model.advance(vectors.unsqueeze(0))
+                states = self.model.advance(nn.utils.rnn.pad_sequence([vectors, vectors[:1]], batch_first=True),
+                                            lengths=torch.tensor([len(queries), 1]))
+                states = self.model.advance(vectors[:1].unsqueeze(0), states[:, :1, :].contiguous())
+                hybrid_top_k_many(
+                    self.model.head(states[-1]).numpy(), self.vector_store, self.db_interests, 10,
+                    semantic_weight=0.7, popularity_weight=0.3, index=self.ann_index,
+                    n_candidates=GRU_ANN_CANDIDATES, extra_candidates=self.popular_candidates,
+                    rerank=GRU_RERANK
+                )
+
+    def build_ann_index(self, n_lists: Optional[int] = None, nprobe: int = GRU_ANN_NPROBE,
+                        save: bool = True) -> IVFIndex:
+        """
+        Construit l'index IVF des vecteurs musicaux et le sauvegarde à côté du modèle.
+        save=False : l'index est seulement rattaché (vérification du recall avant
+        sauvegarde, cf. build_gru_index.py).
+        """
+        index = IVFIndex.build(self.vector_store, n_lists=n_lists, nprobe=nprobe)
+        if save:
+            index.save(self.ann_index_path)
+        self.ann_index = index
+        return index
 
 
 # Instance globale (chargée au premier import)
@@ -0,0 +1,80 @@
+"""
+Exécution des calculs de recommandation hors des threads de requêtes de l'API.
+
+Les routes de recommandation étaient des `def` synchrones : chaque appel
+occupait un thread du pool HTTP de FastAPI pendant tout le calcul torch /
+scipy, en concurrence avec les threads intra-op de torch et de BLAS. En pic,
+les routes légères du catalogue attendaient derrière les recommandations.
+
+Ici, un pool dédié et borné (INFERENCE_WORKERS threads, dimensionné à part
+du pool HTTP) exécute les calculs ; les routes `async def` l'attendent sans
+bloquer la boucle d'événements. Les threads torch / BLAS sont fixés pour que
+INFERENCE_WORKERS x threads intra-op ne dépasse pas le nombre de cœurs.
+
+threadpoolctl ne limite que les bibliothèques BLAS / OpenMP déjà chargées :
+limit_blas_threads() est rappelée après le chargement de chaque modèle. Pour
+une limite valable dès l'import, définir aussi OMP_NUM_THREADS /
+OPENBLAS_NUM_THREADS / MKL_NUM_THREADS avant de lancer uvicorn.
+"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Calculs de recommandation simultanés (torch et numpy relâchent le GIL)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+# Threads intra-op de torch / BLAS par calcul (défaut : cœurs / INFERENCE_WORKERS)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS)
+
+_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+_threads_configured = False
+_blas_limits = None     # limites threadpoolctl en place (restore_original_limits() pour les annuler)
+
+
+def configure_threads(n_threads=INFERENCE_THREADS):
+    """
+    Fixe les threads de torch (intra-op, inter-op à 1) et des bibliothèques BLAS.
+    À appeler avant le premier calcul torch (set_num_interop_threads échoue ensuite).
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    try:
+        import torch
+        torch.set_num_threads(n_threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError) as e:
+        print(f"⚠️ Threads torch non configurés : {e}")
+    # charge les BLAS de numpy et scipy pour que la limite s'y applique
+    import numpy
+    import scipy.linalg
+    limit_blas_threads(n_threads)
+
+
+def limit_blas_threads(n_threads=INFERENCE_THREADS):
+    """
+    Limite les threads des bibliothèques BLAS / OpenMP chargées à cet instant.
+    À rappeler après un import qui en charge de nouvelles (ex : chargement d'un modèle).
+    """
+    global _blas_limits
+    from threadpoolctl import threadpool_limits, threadpool_info
+    _blas_limits = threadpool_limits(n_threads)
+    # bibliothèques effectivement limitées, ex : [("openblas", 4), ("openmp", 4)]
+    return [(info["internal_api"], info["num_threads"]) for info in threadpool_info()]
+
+
+async def run_inference(func, *args, **kwargs):
+    """Exécute func(*args, **kwargs) dans le pool d'inférence et attend le résultat."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def await_future(future):
+    """Attend un concurrent.futures.Future (ex : file de micro-batching) sans bloquer la boucle."""
+    return await asyncio.wrap_future(future)
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,121 @@
+"""
+Chargement des modèles en tâche de fond au démarrage de l'API.
+
+Le recommandeur GRU était construit à la première requête : ce premier
+utilisateur attendait MiniLM, les vecteurs, les métadonnées et le GRU, et un
+échec de chargement restait définitif (is_ready=False jusqu'au redémarrage).
+
+Ici, un BackgroundLoader par modèle :
+  - charge le modèle dans un thread dès le démarrage
+  - exécute une passe de warm-up (pages memory-mapped lues, chemins
+    TorchScript / BLAS initialisés) avant de déclarer le modèle prêt
+  - réessaie toutes les `retry_seconds` après un échec
+  - décrit son état (et celui de chaque composant) pour /health/ready
+"""
+import time
+import threading
+
+
+PENDING, LOADING, WARMING, READY, FAILED = "pending", "loading", "warming", "ready", "failed"
+
+
+class BackgroundLoader:
+    """
+    name          : nom du modèle (rapport de santé, logs)
+    load_fn       : fonction components -> modèle chargé ; remplit le dict
+                    `components` (nom -> état / durée) et lève une exception en cas d'échec
+    warm_up_fn    : fonction modèle -> None, exécutée avant de déclarer le modèle prêt
+    retry_seconds : délai avant une nouvelle tentative après un échec
+    """
+    def __init__(self, name, load_fn, warm_up_fn=None, retry_seconds=60.0):
+        self.name = name
+        self.load_fn = load_fn
+        self.warm_up_fn = warm_up_fn
+        self.retry_seconds = retry_seconds
+        self.value = None
+        self.state = PENDING
+        self.error = None
+        self.attempts = 0
+        self.components = {}
+        self.timings = {}
+        self._started_at = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def get(self):
+        """Le modèle s'il est chargé et chauffé, sinon None."""
+        return self.value if self.is_ready else None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"load-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Attend que le modèle soit prêt (True) ou la fin du délai (False)."""
+        return self._ready.wait(timeout)
+
+    def retry(self):
+        """Nouvelle tentative immédiate si le dernier chargement a échoué."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # -------------------------
+    # Thread de chargement
+    # -------------------------
+    def _attempt(self):
+        self.attempts += 1
+        self.error = None
+        self.components = {}
+        self.timings = {}
+        self._started_at = time.perf_counter()
+
+        self.state = LOADING
+        value = self.load_fn(self.components)
+        self.timings["load_seconds"] = round(time.perf_counter() - self._started_at, 3)
+
+        if self.warm_up_fn is not None:
+            self.state = WARMING
+            start = time.perf_counter()
+            self.warm_up_fn(value)
+            self.timings["warm_up_seconds"] = round(time.perf_counter() - start, 3)
+
+        self.value = value
+        self.state = READY
+        self._ready.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._attempt()
+                print(f"✅ {self.name} prêt ({self.timings.get('load_seconds', 0):.1f} s de chargement, "
+                      f"{self.timings.get('warm_up_seconds', 0):.1f} s de warm-up)")
+                return
+            except Exception as e:
+                self.state = FAILED
+                self.error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ {self.name} non disponible (tentative {self.attempts}) : {e}"
+                      f" - nouvel essai dans {self.retry_seconds:.0f} s")
+            self._wake.wait(self.retry_seconds)
+            self._wake.clear()
+
+    def report(self):
+        """État pour /health/ready : étape, tentatives, durées et composants."""
+        report = {"state": self.state, "attempts": self.attempts, **self.timings}
+        if self.state in (LOADING, WARMING) and self._started_at is not None:
+            report["elapsed_seconds"] = round(time.perf_counter() - self._started_at, 3)
+        if self.error:
+            report["error"] = self.error
+        if self.components:
+            report["components"] = dict(self.components)
+        return report
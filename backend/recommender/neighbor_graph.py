@@ -0,0 +1,224 @@
+"""
+Graphe des plus proches voisins pré-calculé pour le moteur TF-IDF.
+
+Le catalogue change peu entre deux imports : on calcule une fois pour toutes
+les N voisins cosinus de chaque piste (indices int32 + scores float32),
+ce qui ramène une recommandation en ligne à une simple lecture de ligne.
+
+Le calcul est découpé en blocs de lignes répartis sur un pool de processus.
+Chaque bloc terminé est écrit sur disque : un build interrompu reprend
+là où il s'était arrêté.
+"""
+import os
+import json
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+
+
+GRAPH_INDICES_FILE = "neighbors_idx.npy"
+GRAPH_SCORES_FILE = "neighbors_score.npy"
+GRAPH_MANIFEST_FILE = "neighbors.json"
+BLOCKS_DIR = "neighbors_blocks"
+
+# Matrice partagée par les processus du pool (chargée une fois par worker)
+_worker_matrix = None
+_worker_matrix_t = None
+
+
+# -------------------------
+# Calcul d'un bloc
+# -------------------------
+def top_neighbors(query_matrix, matrix_t, rows, n_neighbors):
+    """
+    Top-N voisins cosinus des lignes `query_matrix` (lignes `rows` du catalogue).
+    Les lignes TF-IDF étant normalisées L2, le cosinus est un simple produit scalaire :
+    un seul produit sparse x sparse pour tout le bloc.
+    La piste elle-même est exclue de ses voisins.
+    Retourne (indices [b, N] int32, scores [b, N] float32) triés par score décroissant.
+    """
+    sims = (query_matrix @ matrix_t).toarray()
+    return top_from_similarities(sims, rows, n_neighbors)
+
+def top_from_similarities(sims, rows, n_neighbors):
+    """
+    Sélection top-N sur un bloc de similarités déjà calculées [b, n_items]
+    (produit sparse ou dense), en excluant la piste elle-même (`rows`).
+    """
+    sims = np.asarray(sims, dtype=np.float32)
+    n_rows, n_items = sims.shape
+    rows = np.asarray(rows)
+
+    # on garde une place de plus pour pouvoir retirer la piste elle-même
+    n_keep = min(n_neighbors + 1, n_items)
+    if n_keep < n_items:
+        cand = np.argpartition(-sims, n_keep - 1, axis=1)[:, :n_keep]
+    else:
+        cand = np.tile(np.arange(n_items), (n_rows, 1))
+    cand_scores = np.take_along_axis(sims, cand, axis=1)
+
+    order = np.argsort(-cand_scores, axis=1, kind="stable")
+    cand = np.take_along_axis(cand, order, axis=1)
+    cand_scores = np.take_along_axis(cand_scores, order, axis=1)
+
+    # retire la piste elle-même, ou le dernier candidat si elle n'y est pas
+    keep = cand != rows[:, None]
+    keep[~(~keep).any(axis=1), -1] = False
+    n_out = n_keep - 1
+    return (cand[keep].reshape(n_rows, n_out).astype(np.int32),
+            cand_scores[keep].reshape(n_rows, n_out).astype(np.float32))
+
+def top_neighbors_block(matrix, matrix_t, start, stop, n_neighbors):
+    """Top-N voisins des lignes contiguës [start, stop) de `matrix`."""
+    return top_neighbors(matrix[start:stop], matrix_t, np.arange(start, stop), n_neighbors)
+
+def patch_neighbor_graph(indices, scores, matrix, matrix_t, max_block_cells=2 ** 26):
+    """
+    Étend le graphe aux lignes ajoutées à `matrix` depuis son calcul
+    (lignes [len(indices), n_items), mises à jour incrémentales) :
+      - chaque ligne ajoutée reçoit son propre top-N
+      - elle est insérée dans le top-N des lignes existantes qu'elle dépasse
+    Un seul produit (lignes ajoutées x catalogue) par bloc, le cosinus étant
+    symétrique. Les tableaux d'entrée (souvent memory-mapped) ne sont pas modifiés.
+    Retourne (indices, scores) couvrant toutes les lignes de `matrix`.
+    """
+    start, n_neighbors = indices.shape
+    n_items = matrix.shape[0]
+    if start >= n_items or n_neighbors == 0:
+        return indices, scores
+    indices = np.array(indices, dtype=np.int32)
+    scores = np.array(scores, dtype=np.float32)
+
+    # blocs bornés : [b, n_items] similarités denses en mémoire à la fois
+    block_size = max(1, min(512, max_block_cells // n_items))
+    added_indices, added_scores = [], []
+    for lo in range(start, n_items, block_size):
+        hi = min(lo + block_size, n_items)
+        sims = np.asarray((matrix[lo:hi] @ matrix_t).toarray(), dtype=np.float32)
+        block_indices, block_scores = top_from_similarities(sims, np.arange(lo, hi), n_neighbors)
+        added_indices.append(block_indices)
+        added_scores.append(block_scores)
+
+        to_existing = sims[:, :start].T                   # [start, b]
+        affected = np.flatnonzero((to_existing > scores[:, -1:]).any(axis=1))
+        if len(affected):
+            new_cols = np.broadcast_to(np.arange(lo, hi, dtype=np.int32), (len(affected), hi - lo))
+            cand = np.hstack([indices[affected], new_cols])
+            cand_scores = np.hstack([scores[affected], to_existing[affected]])
+            order = np.argsort(-cand_scores, axis=1, kind="stable")[:, :n_neighbors]
+            indices[affected] = np.take_along_axis(cand, order, axis=1)
+            scores[affected] = np.take_along_axis(cand_scores, order, axis=1)
+
+    return np.vstack([indices] + added_indices), np.vstack([scores] + added_scores)
+
+
+def _block_path(blocks_dir, start):
+    return os.path.join(blocks_dir, f"block_{start:010d}.npz")
+
+def _init_worker(matrix_path):
+    global _worker_matrix, _worker_matrix_t
+    _worker_matrix = sp.load_npz(matrix_path).tocsr()
+    # transposée CSR : index inversé terme -> pistes, le plus rapide pour le produit
+    _worker_matrix_t = _worker_matrix.T.tocsr()
+
+def _compute_and_store_block(start, stop, n_neighbors, blocks_dir):
+    indices, scores = top_neighbors_block(_worker_matrix, _worker_matrix_t, start, stop, n_neighbors)
+    path = _block_path(blocks_dir, start)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, indices=indices, scores=scores)
+    # écriture atomique : un bloc présent sur disque est forcément complet
+    os.replace(tmp_path, path)
+    return start
+
+
+# -------------------------
+# Construction du graphe complet
+# -------------------------
+def build_neighbor_graph(directory, n_neighbors=100, block_size=512, n_jobs=None,
+                         matrix_file="tfidf_matrix.npz"):
+    """
+    Calcule le graphe des voisins de l'artefact TF-IDF stocké dans `directory`.
+
+    n_neighbors : nombre de voisins conservés par piste
+    block_size  : nombre de lignes par bloc (borne la mémoire de chaque worker)
+    n_jobs      : nombre de processus (None = tous les cœurs, 1 = sans pool)
+
+    Les processus sont démarrés en "spawn" : un fork de l'API (threads torch,
+    pool d'inférence) peut rester bloqué sur un verrou hérité.
+    """
+    matrix_path = os.path.join(directory, matrix_file)
+    n_items = sp.load_npz(matrix_path).shape[0]
+    n_neighbors = max(min(n_neighbors, n_items - 1), 0)
+
+    blocks_dir = os.path.join(directory, BLOCKS_DIR)
+    os.makedirs(blocks_dir, exist_ok=True)
+
+    starts = list(range(0, n_items, block_size))
+    # reprise : les blocs déjà écrits ne sont pas recalculés
+    todo = [s for s in starts if not os.path.exists(_block_path(blocks_dir, s))]
+    print(f"   → Graphe de voisins : {len(starts) - len(todo)}/{len(starts)} blocs déjà calculés")
+
+    if todo:
+        if n_jobs == 1:
+            _init_worker(matrix_path)
+            for start in todo:
+                _compute_and_store_block(start, min(start + block_size, n_items), n_neighbors, blocks_dir)
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(matrix_path,),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [
+                    pool.submit(_compute_and_store_block, start, min(start + block_size, n_items),
+                                n_neighbors, blocks_dir)
+                    for start in todo
+                ]
+                for done, future in enumerate(futures, 1):
+                    future.result()
+                    if done % 50 == 0 or done == len(futures):
+                        print(f"   → {done}/{len(futures)} blocs calculés")
+
+    # assemblage direct dans les fichiers finaux (memmap, pas de copie en RAM)
+    indices = np.lib.format.open_memmap(os.path.join(directory, GRAPH_INDICES_FILE), mode="w+",
+                                        dtype=np.int32, shape=(n_items, n_neighbors))
+    scores = np.lib.format.open_memmap(os.path.join(directory, GRAPH_SCORES_FILE), mode="w+",
+                                       dtype=np.float32, shape=(n_items, n_neighbors))
+    for start in starts:
+        with np.load(_block_path(blocks_dir, start)) as block:
+            stop = start + block["indices"].shape[0]
+            indices[start:stop] = block["indices"]
+            scores[start:stop] = block["scores"]
+    indices.flush()
+    scores.flush()
+    del indices, scores
+
+    info = _write_graph_manifest(directory, n_items, n_neighbors, block_size=block_size)
+    shutil.rmtree(blocks_dir)
+    return info
+
+
+def _write_graph_manifest(directory, n_items, n_neighbors, **extra):
+    info = {"n_items": int(n_items), "n_neighbors": int(n_neighbors), **extra}
+    with open(os.path.join(directory, GRAPH_MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+def save_neighbor_graph(directory, indices, scores):
+    """Écrit un graphe déjà calculé (ex : lors d'une nouvelle sauvegarde de l'artefact)."""
+    np.save(os.path.join(directory, GRAPH_INDICES_FILE), np.asarray(indices, dtype=np.int32))
+    np.save(os.path.join(directory, GRAPH_SCORES_FILE), np.asarray(scores, dtype=np.float32))
+    return _write_graph_manifest(directory, indices.shape[0], indices.shape[1])
+
+
+def load_neighbor_graph(directory):
+    """
+    Charge le graphe (memory-mapped) s'il existe et est complet, sinon None.
+    Retourne (indices [n, N] int32, scores [n, N] float32).
+    """
+    manifest_path = os.path.join(directory, GRAPH_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    indices = np.load(os.path.join(directory, GRAPH_INDICES_FILE), mmap_mode="r")
+    scores = np.load(os.path.join(directory, GRAPH_SCORES_FILE), mmap_mode="r")
+    return indices, scores
@@ -0,0 +1,145 @@
+"""
+Mode d'inférence CPU optimisé du recommandeur GRU (GRU_INFERENCE_MODE=optimized).
+
+  - SemanticGRU : quantification dynamique int8 des couches GRU et Linear
+    (poids int8, activations quantifiées à la volée), puis compilation
+    TorchScript. Le module compilé est sauvegardé sur disque et rechargé tel
+    quel aux démarrages suivants (reconstruit si les poids float changent).
+  - Encodeur MiniLM : quantification dynamique int8 des couches Linear et
+    longueur maximale de séquence réduite (les recherches sont courtes).
+
+compare_models / compare_encoders mesurent l'écart avec les modèles float :
+cosinus entre vecteurs "envie" et recouvrement des top-k recommandés.
+"""
+import os
+import copy
+import json
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch import Tensor
+
+
+OPTIMIZED_DIR = "optimized_model"
+OPTIMIZED_GRU_FILE = "gru_int8_scripted.pt"
+OPTIMIZED_MANIFEST_FILE = "manifest.json"
+
+
+class GRUInference(nn.Module):
+    """Couches de SemanticGRU exposées sous une forme compilable par TorchScript."""
+    def __init__(self, gru, fc):
+        super().__init__()
+        self.gru = gru
+        self.fc = fc
+
+    def forward(self, x: Tensor, lengths: Tensor) -> Tensor:
+        packed = nn.utils.rnn.pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+        _, hidden = self.gru(packed)
+        return hidden
+
+    @torch.jit.export
+    def step(self, x: Tensor, hidden: Tensor) -> Tensor:
+        _, hidden = self.gru(x, hidden)
+        return hidden
+
+    @torch.jit.export
+    def head(self, last_step: Tensor) -> Tensor:
+        return nn.functional.normalize(self.fc(last_step), p=2.0, dim=1)
+
+
+class OptimizedGRU:
+    """Même interface que SemanticGRU (advance / head) autour du module TorchScript int8."""
+    def __init__(self, scripted):
+        self.scripted = scripted
+
+    def eval(self):
+        self.scripted.eval()
+        return self
+
+    def advance(self, x, hidden=None, lengths=None):
+        if hidden is not None:
+            return self.scripted.step(x, hidden)
+        if lengths is None:
+            lengths = torch.full((x.shape[0],), x.shape[1], dtype=torch.int64)
+        return self.scripted(x, lengths)
+
+    def head(self, last_step):
+        return self.scripted.head(last_step)
+
+
+# -------------------------
+# Construction / cache disque
+# -------------------------
+def quantize_gru(model):
+    """Copie int8 (quantification dynamique) des couches GRU et Linear, compilée en TorchScript."""
+    module = GRUInference(copy.deepcopy(model.gru), copy.deepcopy(model.fc)).eval()
+    module = torch.ao.quantization.quantize_dynamic(module, {nn.GRU, nn.Linear}, dtype=torch.qint8)
+    return torch.jit.script(module)
+
+def _source_signature(model_file):
+    stat = os.stat(model_file)
+    return {"source": os.path.abspath(model_file), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_optimized_gru(model, model_file, directory):
+    """
+    Module GRU optimisé pour les poids `model_file` : relu depuis `directory`
+    s'il y a été construit à partir de ces mêmes poids, sinon construit et sauvegardé.
+    """
+    path = os.path.join(directory, OPTIMIZED_GRU_FILE)
+    manifest_path = os.path.join(directory, OPTIMIZED_MANIFEST_FILE)
+    signature = _source_signature(model_file)
+    if os.path.exists(path) and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f).get("gru") == signature:
+                return OptimizedGRU(torch.jit.load(path, map_location="cpu")).eval()
+
+    scripted = quantize_gru(model)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.jit.save(scripted, tmp_path)
+    os.replace(tmp_path, path)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"gru": signature}, f, indent=2)
+    return OptimizedGRU(scripted).eval()
+
+def optimize_encoder(encoder, max_seq_length=32, inplace=True):
+    """Encodeur SentenceTransformer avec couches Linear int8 et séquences tronquées."""
+    encoder = torch.ao.quantization.quantize_dynamic(encoder, {nn.Linear}, dtype=torch.qint8, inplace=inplace)
+    encoder.max_seq_length = max_seq_length
+    return encoder
+
+
+# -------------------------
+# Contrôle de précision
+# -------------------------
+def _vibe_vectors(model, sequences):
+    lengths = torch.tensor([len(s) for s in sequences])
+    padded = nn.utils.rnn.pad_sequence(sequences, batch_first=True)
+    with torch.no_grad():
+        return model.head(model.advance(padded, lengths=lengths)[-1])
+
+def compare_models(float_model, optimized_model, sequences, store=None, interests=None, top_k=10):
+    """
+    Écart entre le GRU float et le GRU optimisé sur des séquences d'embeddings [len, 384] :
+    cosinus entre vecteurs "envie" et, avec le catalogue, recouvrement des top-k.
+    """
+    from recommender.ann_index import hybrid_top_k_many
+
+    reference = _vibe_vectors(float_model, sequences)
+    optimized = _vibe_vectors(optimized_model, sequences)
+    cosines = nn.functional.cosine_similarity(reference, optimized).numpy()
+    report = {"n_sequences": len(sequences), "cosine_mean": float(cosines.mean()), "cosine_min": float(cosines.min())}
+    if store is not None:
+        expected = hybrid_top_k_many(reference.numpy(), store, interests, top_k)
+        found = hybrid_top_k_many(optimized.numpy(), store, interests, top_k)
+        report[f"top{top_k}_overlap"] = float(np.mean([len(np.intersect1d(a, b)) / top_k
+                                                       for a, b in zip(expected, found)]))
+    return report
+
+def compare_encoders(float_encoder, optimized_encoder, queries):
+    """Cosinus entre embeddings float et optimisés des mêmes recherches."""
+    reference = torch.as_tensor(np.asarray(float_encoder.encode(queries, convert_to_numpy=True)))
+    optimized = torch.as_tensor(np.asarray(optimized_encoder.encode(queries, convert_to_numpy=True)))
+    cosines = nn.functional.cosine_similarity(reference, optimized).numpy()
+    return {"n_queries": len(queries), "cosine_mean": float(cosines.mean()), "cosine_min": float(cosines.min())}
@@ -0,0 +1,97 @@
+"""
+Cache des recommandations calculées, par utilisateur.
+
+Les clients rappellent souvent les routes de recommandation alors que
+l'historique de l'utilisateur n'a pas bougé : le même résultat était
+recalculé à chaque fois. Ici :
+  - clé : (user_id, empreinte de l'historique lu en base, paramètres de la
+    requête) ; un historique modifié donne une autre clé, même si
+    l'invalidation n'a pas eu lieu (autre worker, écriture hors API)
+  - LRU bornée en mémoire, chaque entrée expire après `ttl_seconds`
+  - invalidate_user() supprime les entrées d'un utilisateur dès qu'une
+    écriture change son historique (POST /SearchHistory, écoutes)
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def history_key(items):
+    """Empreinte courte et stable d'un historique (liste de recherches, de (track_id, poids)...)."""
+    return hashlib.blake2b(repr(list(items)).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """
+    max_entries : nombre maximal de résultats gardés (tous utilisateurs confondus)
+    ttl_seconds : durée de vie d'un résultat (0 = pas d'expiration)
+    """
+    def __init__(self, max_entries=100_000, ttl_seconds=600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()      # clé -> (expiration, résultat)
+        self._user_keys = {}               # user_id -> clés en cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[key[0]]
+
+    def get(self, user_id, history, *params):
+        """Résultat en cache pour (utilisateur, empreinte d'historique, paramètres), sinon None."""
+        key = (user_id, history, *params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and entry[0] < time.monotonic():
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, history, *params, result):
+        key = (user_id, history, *params)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        """Supprime tous les résultats de l'utilisateur (son historique vient de changer)."""
+        with self._lock:
+            keys = self._user_keys.pop(user_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            if keys:
+                self.invalidations += 1
+            return len(keys)
+
+    def clear(self):
+        """Vide le cache (ex : modèle ou index remplacé)."""
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self), "users": len(self._user_keys), "hits": self.hits, "misses": self.misses,
+                "expired": self.expired, "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,91 @@
+"""
+Recherche top-k par produit scalaire pour le moteur TF-IDF.
+
+Remplace NearestNeighbors(metric="cosine", algorithm="brute") : les lignes
+TF-IDF étant déjà normalisées L2, le cosinus est un simple produit scalaire.
+On garde la transposée de la matrice au format CSR (un index inversé
+terme -> pistes) : une requête ne parcourt que les colonnes de ses propres
+termes, puis argpartition extrait le top-k sans trier tout le catalogue.
+
+DenseCosineSearch fait la même chose sur des embeddings denses de faible
+dimension (projection SVD de la matrice TF-IDF).
+"""
+import numpy as np
+import scipy.sparse as sp
+
+
+class SparseCosineSearch:
+    """
+    Même interface que sklearn.neighbors.NearestNeighbors pour ce dont le moteur
+    a besoin : fit(matrix) puis kneighbors(X, n_neighbors) -> (distances, indices),
+    avec distance = 1 - similarité cosinus.
+
+    Les lignes de la matrice doivent être normalisées L2 (sortie de TfidfVectorizer).
+    """
+    def __init__(self, n_neighbors=50):
+        self.n_neighbors = n_neighbors
+        self.matrix_t = None
+        self.n_items = 0
+
+    def fit(self, matrix):
+        # transposée en CSR : index inversé terme -> pistes
+        self.matrix_t = sp.csr_matrix(matrix).T.tocsr()
+        self.n_items = matrix.shape[0]
+        return self
+
+    def similarities(self, X):
+        """Similarités cosinus denses [n_requêtes, n_items]."""
+        return (sp.csr_matrix(X) @ self.matrix_t).toarray()
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        return _kneighbors(self.similarities(X), min(n_neighbors or self.n_neighbors, self.n_items),
+                           return_distance)
+
+    @property
+    def nbytes(self):
+        if self.matrix_t is None:
+            return 0
+        return int(self.matrix_t.data.nbytes + self.matrix_t.indices.nbytes + self.matrix_t.indptr.nbytes)
+
+
+class DenseCosineSearch:
+    """
+    Variante dense de SparseCosineSearch : produit matrice-vecteur sur un tableau
+    contigu float32 [n_items, d] dont les lignes sont normalisées L2.
+    """
+    def __init__(self, n_neighbors=50):
+        self.n_neighbors = n_neighbors
+        self.embeddings = None
+        self.n_items = 0
+
+    def fit(self, embeddings):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.n_items = self.embeddings.shape[0]
+        return self
+
+    def similarities(self, X):
+        return np.atleast_2d(np.asarray(X, dtype=np.float32)) @ self.embeddings.T
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        return _kneighbors(self.similarities(X), min(n_neighbors or self.n_neighbors, self.n_items),
+                           return_distance)
+
+    @property
+    def nbytes(self):
+        return 0 if self.embeddings is None else int(self.embeddings.nbytes)
+
+
+def _kneighbors(sims, n_neighbors, return_distance=True):
+    """Top-k trié par similarité décroissante, au format NearestNeighbors."""
+    n_items = sims.shape[1]
+    if n_neighbors < n_items:
+        top = np.argpartition(-sims, n_neighbors - 1, axis=1)[:, :n_neighbors]
+    else:
+        top = np.tile(np.arange(n_items), (sims.shape[0], 1))
+    top_sims = np.take_along_axis(sims, top, axis=1)
+
+    order = np.argsort(-top_sims, axis=1, kind="stable")
+    indices = np.take_along_axis(top, order, axis=1)
+    if not return_distance:
+        return indices
+    return 1 - np.take_along_axis(top_sims, order, axis=1), indices
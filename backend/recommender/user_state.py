@@ -0,0 +1,86 @@
+"""
+État caché GRU par utilisateur pour le recommandeur sémantique.
+
+Le GRU relisait les 20 dernières recherches depuis un état nul à chaque
+recommandation. On garde ici, pour chaque utilisateur, l'état caché obtenu
+après sa fenêtre de recherches (clés normalisées) : une nouvelle recherche
+fait avancer l'état d'un seul pas, et une recommandation n'applique plus
+que la couche finale.
+
+L'état n'est réutilisé que si sa fenêtre est exactement celle lue en base :
+quand la fenêtre glisse (plus de 20 recherches), l'état ne peut pas "oublier"
+la plus ancienne et le calcul complet est refait.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class UserStateCache:
+    """
+    LRU bornée : user_id -> (fenêtre de clés normalisées, état caché [num_layers, hidden_dim]).
+    """
+    def __init__(self, max_users=100_000):
+        self.max_users = max_users
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, user_id, window):
+        """État caché si la fenêtre en cache est exactement `window`, sinon None."""
+        window = tuple(window)
+        with self._lock:
+            entry = self._states.get(user_id)
+            if entry is None or entry[0] != window:
+                self.misses += 1
+                return None
+            self._states.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, user_id):
+        """(fenêtre, état) en cache pour l'utilisateur, sans toucher aux compteurs."""
+        with self._lock:
+            return self._states.get(user_id)
+
+    def put(self, user_id, window, state):
+        with self._lock:
+            self._states[user_id] = (tuple(window), state)
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_users:
+                self._states.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._states.pop(user_id, None)
+
+    # -------------------------
+    # Persistance
+    # -------------------------
+    def save(self, path):
+        """Écrit les états (ordre LRU conservé) dans un fichier .pt."""
+        with self._lock:
+            items = list(self._states.items())
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save({"users": [u for u, _ in items], "windows": [w for _, (w, _) in items],
+                    "states": torch.stack([s for _, (_, s) in items]) if items else None}, tmp_path)
+        os.replace(tmp_path, path)
+        return len(items)
+
+    def load(self, path):
+        data = torch.load(path, map_location="cpu")
+        if data["states"] is not None:
+            for user_id, window, state in zip(data["users"], data["windows"], data["states"]):
+                self.put(user_id, window, state)
+        return len(self)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"users": len(self), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,307 @@
+"""
+Stockage des vecteurs musicaux du recommandeur GRU.
+
+Les vecteurs sont normalisés L2 une seule fois (au chargement ou à la conversion) :
+le cosinus devient un simple produit scalaire, sans renormaliser tout le
+catalogue à chaque requête comme le faisait cosine_similarity.
+
+Modes de stockage (résident en mémoire) :
+  - "float32" : vecteurs normalisés, score exact
+  - "float16" : moitié de la mémoire, score approché
+  - "int8"    : quart de la mémoire (+ une échelle float32 par vecteur), score approché
+
+En modes approchés, les meilleurs candidats sont re-notés exactement à partir
+de la copie float32 sur disque (np.memmap : seules les lignes lues sont chargées).
+
+Sur disque, tout est en .npy ouvert en memory-map : le chargement ne copie rien
+et les pages sont partagées entre les workers uvicorn par le cache du système.
+convert_vectors écrit ce format à partir de paquets de vecteurs (ex : les
+anciens vectors_chunk_{i}.pt), sans jamais assembler la matrice en mémoire.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+
+VECTOR_MODES = ("float32", "float16", "int8")
+STORE_MANIFEST_FILE = "manifest.json"
+EXACT_VECTORS_FILE = "vectors_f32.npy"
+
+
+def normalize_rows(vectors, block_size=16384):
+    """Normalise L2 les lignes en place, par paquets (pas de copie de la matrice)."""
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block /= norms
+    return vectors
+
+def quantize_int8(vectors, block_size=16384):
+    """Quantification symétrique int8 avec une échelle par vecteur."""
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    scales = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        scale = np.abs(block).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        codes[start:start + block_size] = np.round(block / scale[:, None])
+        scales[start:start + block_size] = scale
+    return codes, scales
+
+
+class VectorStore:
+    """
+    codes  : vecteurs normalisés dans le dtype du mode (résidents)
+    scales : échelle par vecteur (mode int8 uniquement)
+    exact  : vecteurs normalisés float32 pour le re-classement (souvent un memmap) ;
+             en mode float32, ce sont les codes eux-mêmes
+    """
+    def __init__(self, codes, scales=None, exact=None, mode="float32", block_size=16384):
+        if mode not in VECTOR_MODES:
+            raise ValueError(f"Mode de stockage inconnu : {mode}")
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales
+        self.exact = codes if mode == "float32" else exact
+        self.block_size = block_size
+
+    @classmethod
+    def from_vectors(cls, vectors, mode="float32", copy=True):
+        """Normalise (copie par défaut) puis quantifie selon le mode."""
+        normalized = np.array(vectors, dtype=np.float32, copy=copy)
+        normalize_rows(normalized)
+        if mode == "float32":
+            return cls(normalized, mode=mode)
+        if mode == "float16":
+            return cls(normalized.astype(np.float16), exact=normalized, mode=mode)
+        codes, scales = quantize_int8(normalized)
+        return cls(codes, scales, exact=normalized, mode=mode)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def dim(self):
+        return self.codes.shape[1]
+
+    @property
+    def is_exact(self):
+        return self.mode == "float32"
+
+    # -------------------------
+    # Scores
+    # -------------------------
+    def _dequantize(self, rows, block):
+        block = np.asarray(block, dtype=np.float32)
+        if self.mode == "int8":
+            block = block * self.scales[rows][:, None]
+        return block
+
+    def scores(self, query):
+        """Cosinus (approché hors float32) de `query` normalisée avec tout le catalogue."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if self.mode == "float32":
+            return np.asarray(self.codes @ query)
+        # dtype réduit : conversion par paquets puis produit BLAS float32
+        out = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), self.block_size):
+            stop = min(start + self.block_size, len(self.codes))
+            out[start:stop] = np.asarray(self.codes[start:stop], dtype=np.float32) @ query
+        if self.mode == "int8":
+            out *= self.scales
+        return out
+
+    def scores_many(self, queries):
+        """Cosinus [n_requêtes, n_items] pour un batch de requêtes normalisées : un seul produit matriciel."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.mode == "float32":
+            return np.asarray(queries @ self.codes.T)
+        out = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), self.block_size):
+            stop = min(start + self.block_size, len(self.codes))
+            out[:, start:stop] = queries @ np.asarray(self.codes[start:stop], dtype=np.float32).T
+        if self.mode == "int8":
+            out *= self.scales
+        return out
+
+    def scores_for(self, ids, query):
+        """Cosinus (approché hors float32) pour les lignes `ids`."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        return self._dequantize(ids, self.codes[ids]) @ query
+
+    def exact_scores_for(self, ids, query):
+        """Cosinus exact pour les lignes `ids` (copie float32), approché si elle est absente."""
+        if self.exact is None:
+            return self.scores_for(ids, query)
+        # lecture triée : accès séquentiel aux pages du memmap
+        order = np.argsort(ids)
+        scores = np.empty(len(ids), dtype=np.float32)
+        scores[order] = np.asarray(self.exact[ids[order]], dtype=np.float32) @ np.asarray(query, dtype=np.float32).ravel()
+        return scores
+
+    # -------------------------
+    # Mémoire / qualité
+    # -------------------------
+    @property
+    def nbytes(self):
+        """Mémoire résidente du stockage (la copie exacte memory-mapped n'est pas comptée)."""
+        resident = self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        if self.exact is not None and self.exact is not self.codes and not isinstance(self.exact, np.memmap):
+            resident += self.exact.nbytes
+        return int(resident)
+
+    def fingerprint(self, n_samples=256):
+        """
+        Empreinte du contenu : forme, lignes réparties dans le stockage et somme
+        de chaque colonne (un passage par paquets : toute ligne modifiée change
+        l'empreinte). Calculée sur la copie float32 si présente, pour ne pas
+        dépendre du mode de stockage.
+        """
+        vectors = self.exact if self.exact is not None else self.codes
+        rows = np.unique(np.linspace(0, len(vectors) - 1, min(n_samples, len(vectors))).astype(np.int64))
+        column_sums = np.zeros(vectors.shape[1], dtype=np.float64)
+        for start in range(0, len(vectors), self.block_size):
+            column_sums += np.asarray(vectors[start:start + self.block_size], dtype=np.float64).sum(axis=0)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(vectors.shape).encode())
+        digest.update(np.ascontiguousarray(vectors[rows], dtype=np.float32).tobytes())
+        digest.update(column_sums.astype(np.float32).tobytes())
+        return digest.hexdigest()
+
+    def touch(self, page_size=4096):
+        """
+        Lit une valeur par page des tableaux parcourus par `scores` (codes et
+        échelles) : leurs pages sont en mémoire avant la première requête.
+        La copie float32 d'un mode compact n'est pas lue : seules les lignes
+        re-notées sont chargées, sinon le gain mémoire serait perdu.
+        Retourne les octets parcourus.
+        """
+        touched = 0
+        for array in (a for a in (self.codes, self.scales) if a is not None):
+            flat = array.reshape(-1)
+            np.add.reduce(flat[::max(1, page_size // flat.itemsize)], dtype=np.float64)
+            touched += array.nbytes
+        return int(touched)
+
+    def recall(self, queries, top_k=10, rerank=0):
+        """
+        recall@k du classement par `scores` (approché) par rapport au cosinus exact ;
+        avec `rerank` > 0, les `rerank` meilleurs candidats sont re-notés exactement.
+        """
+        if self.exact is None:
+            raise ValueError("Copie float32 absente : recall non mesurable")
+        recalls = []
+        for query in queries:
+            expected = top_n(np.asarray(self.exact @ query), top_k)
+            approx = self.scores(query)
+            cand = top_n(approx, max(top_k, rerank))
+            if rerank:
+                cand = cand[top_n(self.exact_scores_for(cand, query), top_k)]
+            recalls.append(len(np.intersect1d(expected, cand[:top_k])) / top_k)
+        return float(np.mean(recalls))
+
+    # -------------------------
+    # Persistance
+    # -------------------------
+    def save(self, directory):
+        """Écrit la copie float32 normalisée et les codes du mode courant."""
+        os.makedirs(directory, exist_ok=True)
+        if self.exact is not None and not _same_file(self.exact, os.path.join(directory, EXACT_VECTORS_FILE)):
+            np.save(os.path.join(directory, EXACT_VECTORS_FILE), np.asarray(self.exact, dtype=np.float32))
+        if self.mode == "float16":
+            np.save(os.path.join(directory, "codes_f16.npy"), self.codes)
+        elif self.mode == "int8":
+            np.save(os.path.join(directory, "codes_i8.npy"), self.codes)
+            np.save(os.path.join(directory, "scales_i8.npy"), self.scales)
+        _write_manifest(directory, len(self), self.dim)
+
+    @classmethod
+    def load(cls, directory, mode="float32"):
+        """
+        Ouvre le stockage de `directory` en memory-map (aucune copie, pages partagées
+        entre processus). Les codes du mode demandé sont calculés puis sauvegardés
+        s'ils manquent.
+        """
+        exact = np.load(os.path.join(directory, EXACT_VECTORS_FILE), mmap_mode="r")
+        if mode == "float32":
+            return cls(exact, mode=mode)
+        if mode == "float16":
+            path = os.path.join(directory, "codes_f16.npy")
+            if not os.path.exists(path):
+                _save_atomic(path, np.asarray(exact, dtype=np.float16))
+            return cls(np.load(path, mmap_mode="r"), exact=exact, mode=mode)
+        path = os.path.join(directory, "codes_i8.npy")
+        scales_path = os.path.join(directory, "scales_i8.npy")
+        if not os.path.exists(path):
+            codes, scales = quantize_int8(exact)
+            _save_atomic(scales_path, scales)
+            _save_atomic(path, codes)
+        return cls(np.load(path, mmap_mode="r"), np.load(scales_path), exact=exact, mode=mode)
+
+
+# -------------------------
+# Conversion vers le format disque
+# -------------------------
+def convert_vectors(chunks, shape, directory, source=None):
+    """
+    Écrit `directory`/vectors_f32.npy à partir de paquets consécutifs de vecteurs
+    (tableaux ou tenseurs [b, d]), normalisés au passage : un seul paquet en
+    mémoire à la fois. `shape` est la forme totale [n, d].
+    Les fichiers de codes éventuels (float16 / int8) sont invalidés.
+    """
+    n_items, dim = (int(x) for x in shape)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, EXACT_VECTORS_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n_items, dim))
+    start = 0
+    for chunk in chunks:
+        chunk = normalize_rows(np.array(chunk, dtype=np.float32))
+        out[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    if start != n_items:
+        del out
+        os.remove(tmp_path)
+        raise ValueError(f"{start} vecteurs lus, {n_items} attendus")
+    out.flush()
+    del out
+
+    for name in ("codes_f16.npy", "codes_i8.npy", "scales_i8.npy"):
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    # écriture atomique : plusieurs workers peuvent convertir en même temps
+    os.replace(tmp_path, path)
+    return _write_manifest(directory, n_items, dim, source=source)
+
+
+def _write_manifest(directory, n_items, dim, **extra):
+    info = {"n_items": int(n_items), "dim": int(dim), "normalized": True, **extra}
+    path = os.path.join(directory, STORE_MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, path)
+    return info
+
+def _save_atomic(path, array):
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def store_exists(directory):
+    return os.path.exists(os.path.join(directory, STORE_MANIFEST_FILE))
+
+def _same_file(array, path):
+    return isinstance(array, np.memmap) and array.filename is not None and \
+        os.path.exists(path) and os.path.samefile(array.filename, path)
+
+def top_n(scores, n):
+    """Indices des n plus grands scores, triés par score décroissant."""
+    if n < len(scores):
+        top = np.argpartition(-scores, n - 1)[:n]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
@@ -225,6 +225,12 @@ class UserTrackListeningCreate(BaseModel):
 class SearchHistoryCreate(BaseModel):
     history_query: str
 
+# ==================== Index TF-IDF Schemas ============
+
+class TfidfIndexUpdate(BaseModel):
+    # pistes ajoutées, modifiées ou supprimées depuis le dernier build
+    track_ids: List[int]
+
 
 ##########################################
 ##            SCHÉMAS PATCH             ##
@@ -0,0 +1,39 @@
+import threading
+
+from recommender.batching import BatchScheduler
+
+
+def test_cancelled_request_does_not_stop_batcher():
+    started, release = threading.Event(), threading.Event()
+
+    def batch_fn(requests):
+        started.set()
+        release.wait(5)
+        return [r * 2 for r in requests]
+
+    scheduler = BatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=1)
+    # le thread est bloqué sur ce premier paquet : la requête suivante reste en file
+    first = scheduler.submit(1)
+    assert started.wait(5)
+    pending = scheduler.submit(2)
+    assert pending.cancel()
+    release.set()
+
+    assert first.result(timeout=5) == 2
+    assert scheduler.submit(3).result(timeout=5) == 6
+    assert scheduler.is_alive
+
+
+def test_batch_error_is_sent_to_each_request():
+    def batch_fn(requests):
+        raise ValueError("boom")
+
+    scheduler = BatchScheduler(batch_fn, max_wait_ms=1)
+    future = scheduler.submit(1)
+    try:
+        future.result(timeout=5)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError attendue")
+    assert scheduler.is_alive
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from recommender.benchmarks import make_synthetic_catalog
+from recommender.TF_IDF import ContentRecommender, recall_vs_brute_force
+
+
+@pytest.mark.parametrize("text_mode", ["fields", "concat"])
+def test_budget_pruning_matches_vectorizer(text_mode):
+    df = make_synthetic_catalog(2000)
+    full = ContentRecommender(df, text_mode=text_mode, dtype=np.float32)
+    rec = ContentRecommender(df, text_mode=text_mode, dtype=np.float32, memory_budget_mb=0.3)
+    assert rec.tfidf_matrix.shape[1] < full.tfidf_matrix.shape[1]
+
+    # nouvelles lignes (update_tracks, profils) dans le même espace que la matrice élaguée
+    projected = rec.vectorizer.transform(rec._text_documents(rec.df))
+    assert abs(projected - rec.tfidf_matrix).max() < 1e-5
+
+
+def test_exact_search_has_full_recall():
+    df = make_synthetic_catalog(5000)
+    rec = ContentRecommender(df, text_mode="fields")
+    # ex æquo au k-ième score : l'ordre float32 / float64 ne compte pas comme une erreur
+    assert recall_vs_brute_force(rec, df.track_id.values[:300], top_k=10) == 1.0